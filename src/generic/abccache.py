@@ -0,0 +1,116 @@
+"""
+A process-wide memo for subclass checks between signatures.
+
+issubclass(T, B) is cheap when B is a regular class: Python only looks for B
+in the MRO of T. When B is an ABC (e.g., numbers.Number or
+collections.abc.Sequence), ABCMeta.__subclasscheck__ also walks registries,
+subclass hooks and the subclasses of B. ABCMeta caches its own answers, but
+the negative answers are discarded whenever any class is registered in any
+ABC. The dispatch algorithm compares the same pairs of signatures over and
+over, so even the cached checks add up.
+
+The memo_subtypecheck() function memoizes the result of comparing two tuples
+of types, and issubtype() does the same for a pair of types. The abc module
+increments a global token each time ABC.register() is called. Entries
+computed with an old token are ignored, so registering a class in an ABC
+never produces stale answers. Subclass relations of regular classes depend
+only on their MRO and are not affected by the token. We do not support
+metaclasses with a custom __subclasscheck__ whose answers change without an
+ABC.register() call.
+
+The table holds strong references to the types. It is emptied when it grows
+beyond ``MAXSIZE`` entries.
+"""
+
+import abc
+import collections
+
+__all__ = ['issubtype', 'memo_subtypecheck', 'abc_cache_info',
+           'abc_cache_clear']
+
+try:
+    _abc_token = abc.get_cache_token
+except AttributeError:  # Python 3.3
+    def _abc_token():
+        return abc.ABCMeta._abc_invalidation_counter
+
+MAXSIZE = 16384
+
+ABCCacheInfo = collections.namedtuple(
+    'ABCCacheInfo',
+    ['hits', 'misses', 'avoided', 'invalidations', 'currsize'])
+
+_subclasscheck = abc.ABCMeta.__subclasscheck__
+_memo = {}
+
+# hits, misses, avoided ABC checks and invalidations
+_stats = [0, 0, 0, 0]
+
+
+def memo_subtypecheck(types1, types2):
+    """Return True if each type in the tuple types1 is a subclass of the
+    respective type in the tuple types2. Both tuples must have the same
+    length.
+
+    >>> import numbers
+    >>> memo_subtypecheck((int, str), (numbers.Number, object))
+    True
+    """
+
+    token = _abc_token()
+    key = (types1, types2)
+    stats = _stats
+    try:
+        memo_token, result, nabc = _memo[key]
+    except KeyError:
+        pass
+    else:
+        if memo_token == token:
+            stats[0] += 1
+            stats[2] += nabc
+            return result
+        stats[3] += 1
+
+    # The token was read before the check. If some class is registered in an
+    # ABC in the meantime, this entry is simply ignored by later lookups.
+    stats[1] += 1
+    result = all(issubclass(T, B) for (T, B) in zip(types1, types2))
+    nabc = 0
+    for B in types2:
+        if type(B).__subclasscheck__ is _subclasscheck:
+            nabc += 1
+    if len(_memo) >= MAXSIZE:
+        _memo.clear()
+    _memo[key] = (token, result, nabc)
+    return result
+
+
+def issubtype(T, B):
+    """Equivalent to issubclass(T, B), but memoized.
+
+    >>> import numbers
+    >>> issubtype(int, numbers.Number), issubtype(str, numbers.Number)
+    (True, False)
+    """
+
+    return memo_subtypecheck((T,), (B,))
+
+
+def abc_cache_info():
+    """Return a named tuple with statistics about the memo.
+
+    ``hits`` and ``misses`` count the lookups in the memo, ``avoided`` counts
+    the calls to ABCMeta.__subclasscheck__ that were saved by hits and
+    ``invalidations`` counts the entries that were recomputed after some
+    ABC.register() call.
+    """
+
+    hits, misses, avoided, invalidations = _stats
+    return ABCCacheInfo(hits, misses, avoided, invalidations, len(_memo))
+
+
+def abc_cache_clear():
+    """Clear the memo and reset its statistics."""
+
+    _memo.clear()
+    _stats[:] = [0, 0, 0, 0]
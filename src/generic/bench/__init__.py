@@ -0,0 +1,149 @@
+"""
+Benchmark suite for generic functions and the modules built on top of them.
+
+Run all benchmarks with ``python -m generic.bench``. The suites are:
+
+calls:
+    Generic.__call__ on the last call cache, on the type cache and on cache
+    misses, for the pure Python implementation, for generic.core_fast (if it
+    was compiled) and for a reference implementation that looks up a tuple
+    of types on every call.
+dispatch:
+    The dispatch algorithm for growing registries and arities.
+operators:
+    Operators of generic.op on Object subclasses, convert(), promote() and
+    the parametrization of types with ParametricMeta.__getitem__.
+memory:
+    Bytes per entry of a regular dictionary cache and of a CompactCache.
+
+Results can be saved to a JSON file and compared with the results of another
+commit::
+
+    $ python -m generic.bench --json before.json
+    $ git checkout new-feature
+    $ python -m generic.bench --compare before.json
+
+The comparison lists the benchmarks that are slower than the threshold and
+exits with a non-zero status if there is any. Timings are the best of several
+repetitions, but they are still subject to the noise of the host machine.
+"""
+
+import importlib
+import json
+import platform
+import sys
+import timeit
+
+__all__ = ['SUITES', 'best_time', 'run', 'save_results', 'load_results',
+           'compare', 'print_comparison']
+
+RESULTS_VERSION = 1
+SUITES = ['calls', 'dispatch', 'operators', 'memory']
+
+
+def best_time(func, number, repeat=5):
+    """Return the best time per call of func() in seconds."""
+
+    timer = timeit.Timer(func)
+    return min(timer.repeat(repeat, number)) / number
+
+
+def run(suites=None, scale=1.0, verbose=False):
+    """Run the given suites (default: all) and return a dictionary of results.
+
+    Each suite module defines a run(scale) function that yields (case, value,
+    unit) triples. Results are stored as {'suite/case': {'value': value,
+    'unit': unit}}. The scale multiplies the number of iterations of each
+    timing."""
+
+    results = {}
+    for suite in suites or SUITES:
+        if suite not in SUITES:
+            raise ValueError('invalid suite: %r' % suite)
+        module = importlib.import_module('generic.bench.' + suite)
+        for case, value, unit in module.run(scale):
+            name = '%s/%s' % (suite, case)
+            results[name] = {'value': value, 'unit': unit}
+            if verbose:
+                print('%-50s %s' % (name, _format(value, unit)))
+    return results
+
+
+def save_results(results, file):
+    """Save results of run() to a JSON file (a path or a text file object),
+    together with information about the environment."""
+
+    from generic import core
+
+    data = {
+        'version': RESULTS_VERSION,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'core_fast': core._FastCache is not None,
+        'results': results,
+    }
+    if isinstance(file, str):
+        with open(file, 'w') as F:
+            json.dump(data, F, indent=1, sort_keys=True)
+    else:
+        json.dump(data, file, indent=1, sort_keys=True)
+
+
+def load_results(file):
+    """Load the results saved by save_results()."""
+
+    if isinstance(file, str):
+        with open(file) as F:
+            data = json.load(F)
+    else:
+        data = json.load(file)
+    if data.get('version') != RESULTS_VERSION:
+        raise ValueError('unsupported results version: %r' %
+                         data.get('version'))
+    return data['results']
+
+
+def compare(old, new, threshold=1.1):
+    """Compare two dictionaries of results.
+
+    Return a list of (name, old value, new value, ratio) for all benchmarks
+    present in both dictionaries, sorted by name, and a list with the names
+    of the regressions, i.e., the benchmarks whose ratio new/old is larger
+    than threshold. Lower values are better for all benchmarks.
+
+    >>> old = {'a': {'value': 1.0, 'unit': 's'}}
+    >>> new = {'a': {'value': 1.5, 'unit': 's'}}
+    >>> compare(old, new)[1]
+    ['a']
+    """
+
+    table = []
+    regressions = []
+    for name in sorted(set(old) & set(new)):
+        x, y = old[name]['value'], new[name]['value']
+        ratio = y / x if x else float('inf')
+        table.append((name, x, y, ratio))
+        if ratio > threshold:
+            regressions.append(name)
+    return table, regressions
+
+
+def print_comparison(table, regressions, file=None):
+    """Print the output of compare()."""
+
+    file = sys.stdout if file is None else file
+    print('%-50s %12s %12s %8s' % ('benchmark', 'old', 'new', 'ratio'),
+          file=file)
+    for name, x, y, ratio in table:
+        flag = '  <--' if name in regressions else ''
+        print('%-50s %12.4g %12.4g %8.2f%s' % (name, x, y, ratio, flag),
+              file=file)
+    if regressions:
+        print('\n%s regression(s)' % len(regressions), file=file)
+
+
+def _format(value, unit):
+    if unit == 's':
+        return '%10.1f ns' % (1e9 * value)
+    return '%10.1f %s' % (value, unit)
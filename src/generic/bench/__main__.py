@@ -0,0 +1,52 @@
+import argparse
+import sys
+
+from generic.bench import (SUITES, run, save_results, load_results, compare,
+                           print_comparison)
+
+
+def get_parser():
+    """
+    Creates a new argument parser.
+    """
+    parser = argparse.ArgumentParser('python -m generic.bench')
+    parser.add_argument('suites', nargs='*', metavar='suite',
+                        help='suites to run: %s (default: all)' %
+                             ', '.join(SUITES))
+    parser.add_argument('--json', metavar='FILE',
+                        help='save results to a JSON file')
+    parser.add_argument('--compare', metavar='FILE',
+                        help='compare with results saved in a JSON file')
+    parser.add_argument('--threshold', type=float, default=1.1,
+                        help='ratio new/old reported as a regression '
+                             '(default: 1.1)')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='multiply the number of iterations')
+    return parser
+
+
+def main(args=None):
+    """
+    Run the benchmarks. Returns 1 if a comparison found regressions.
+    """
+
+    parser = get_parser()
+    args = parser.parse_args(args)
+    for suite in args.suites:
+        if suite not in SUITES:
+            parser.error('invalid suite: %r' % suite)
+
+    results = run(args.suites, scale=args.scale, verbose=True)
+    if args.json:
+        save_results(results, args.json)
+    if args.compare:
+        print()
+        table, regressions = compare(load_results(args.compare), results,
+                                     args.threshold)
+        print_comparison(table, regressions)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
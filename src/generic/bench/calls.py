@@ -0,0 +1,80 @@
+"""
+Benchmarks for the call path of generic functions.
+
+Each case is run for the pure Python implementation of Generic.__call__, for
+the C implementation in generic.core_fast (if it was compiled) and for a
+reference implementation that builds a tuple of types and looks it up in the
+cache on every call.
+"""
+
+from generic import core
+from generic.bench import best_time
+
+
+class _TupleLookupGeneric(core.Generic):
+    """Reference implementation: dict lookup of a tuple of types on every
+    call"""
+
+    def __call__(self, *args, **kwds):
+        types = tuple(map(type, args))
+        try:
+            method = self._cache[types]
+        except KeyError:
+            method = self.dispatch(*types)
+        return method(*args, **kwds)
+
+
+_PurePythonGeneric = type('PurePythonGeneric', (core.Generic,),
+                          dict(core._pure_python_methods))
+
+
+def _implementations():
+    """Return a list of (name, Generic subclass) pairs to be benchmarked"""
+
+    result = [('tuple_lookup', _TupleLookupGeneric),
+              ('pure_python', _PurePythonGeneric)]
+    if core._FastCache is not None:
+        result.append(('core_fast', core.Generic))
+    return result
+
+
+def _make_function(cls, arity):
+    func = cls('func')
+    func.register(*([object] * arity), func=lambda *args: None)
+    func.register(*([int] * arity), func=lambda *args: None)
+    return func
+
+
+def run(scale=1.0):
+    """Yield (case, time per call, 's') for each implementation.
+
+    The "last_call" cases repeat the argument types of the previous call. The
+    "cache_hit" case alternates between two different argument types and
+    measures the cost of the cache lookup when the last call cache misses.
+    The "site" case runs the same calls on a call site created with
+    Generic.bind_site(). The "miss" case clears the cache before each call
+    and measures the dispatch algorithm plus the cost of storing its result.
+    """
+
+    number = max(1, int(100000 * scale))
+    for name, cls in _implementations():
+        for arity in [1, 2, 3, 4]:
+            func = _make_function(cls, arity)
+            args = (1,) * arity
+            func(*args)
+            yield ('%s/last_call/%s' % (name, arity),
+                   best_time(lambda: func(*args), number), 's')
+
+        func = _make_function(cls, 2)
+        a, b = (1, 2), (1.0, 2.0)
+        func(*a), func(*b)
+        t = best_time(lambda: (func(*a), func(*b)), number) / 2
+        yield '%s/cache_hit/2' % name, t, 's'
+
+        site = func.bind_site()
+        t = best_time(lambda: (site(*a), site(*b)), number) / 2
+        yield '%s/site/2' % name, t, 's'
+
+        clear = func.clear_cache
+        t = best_time(lambda: (clear(), func(*a)), max(1, number // 10))
+        yield '%s/miss/2' % name, t, 's'
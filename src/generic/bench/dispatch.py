@@ -0,0 +1,37 @@
+"""
+Benchmarks for the dispatch algorithm.
+
+Generic functions are populated with methods for a hierarchy of classes and
+dispatch() is called on subclasses that are not registered, so each call runs
+the full algorithm. The "registry" cases grow the number of methods with a
+fixed arity of 2 and the "arity" cases grow the arity with 10 methods.
+"""
+
+from generic import core
+from generic.bench import best_time
+
+
+def _make_function(size, arity):
+    func = core.Generic('func')
+    func.register(*([object] * arity), func=lambda *args: None)
+    subclasses = []
+    for i in range(size):
+        base = type('B%s' % i, (), {})
+        func.register(*([base] * arity), func=lambda *args: None)
+        subclasses.append(type('S%s' % i, (base,), {}))
+    return func, (subclasses[size // 2],) * arity
+
+
+def run(scale=1.0):
+    """Yield (case, time per dispatch, 's')."""
+
+    number = max(1, int(2000 * scale))
+    for size in [1, 10, 100, 1000]:
+        func, types = _make_function(size, 2)
+        yield ('registry/%s' % size,
+               best_time(lambda: func.dispatch(*types), number), 's')
+
+    for arity in [1, 2, 3, 4]:
+        func, types = _make_function(10, arity)
+        yield ('arity/%s' % arity,
+               best_time(lambda: func.dispatch(*types), number), 's')
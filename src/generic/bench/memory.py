@@ -0,0 +1,53 @@
+"""
+Memory used by the type caches of generic functions.
+
+Compares a regular dictionary cache with a CompactCache filled with the same
+signatures. Memory is measured with tracemalloc and does not include the
+types and the stored implementations, which are shared by both caches.
+"""
+
+import tracemalloc
+from generic.bench import best_time
+from generic.cache import make_cache
+
+
+def cache_size(entries=100000, arity=2):
+    """Return a list of (cache, bytes per entry, lookup time in seconds) for
+    caches filled with the given number of signatures."""
+
+    ntypes = int(entries ** (1 / arity)) + 1
+    classes = [type('T%s' % i, (), {}) for i in range(ntypes)]
+    keys = []
+    for i in range(entries):
+        key = []
+        for _ in range(arity):
+            i, r = divmod(i, ntypes)
+            key.append(classes[r])
+        keys.append(tuple(key))
+    method = lambda *args: None
+
+    results = []
+    for name, compact in [('dict', False), ('compact', True)]:
+        # Keys are rebuilt for each cache, as the dispatch algorithm would
+        tracemalloc.start()
+        start = tracemalloc.get_traced_memory()[0]
+        cache = make_cache(compact=compact)
+        for key in keys:
+            cache[tuple(list(key))] = method
+        size = tracemalloc.get_traced_memory()[0] - start
+        tracemalloc.stop()
+
+        sample = keys[::max(1, entries // 1000)]
+        t = best_time(lambda: [cache[key] for key in sample], 10, 3)
+        results.append((name, size / entries, t / len(sample)))
+        del cache
+    return results
+
+
+def run(scale=1.0):
+    """Yield (case, value, unit) with the bytes per entry and lookup times
+    of caches with 100000 signatures of arity 2."""
+
+    for name, size, t in cache_size(max(1000, int(100000 * scale))):
+        yield '%s/bytes_per_entry' % name, size, 'bytes'
+        yield '%s/lookup' % name, t, 's'
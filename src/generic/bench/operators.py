@@ -0,0 +1,92 @@
+"""
+Benchmarks for the modules built on top of generic functions: the operators
+in generic.op, conversions and promotions in generic.conversion and the
+parametrization of types in generic.parametric.
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from generic import op
+from generic.bench import best_time
+from generic.conversion import convert, convert_many, promote, promote_type
+from generic.parametric import Parametric
+
+
+class Scalar(op.Object):
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __addsame__(self, other):
+        return Scalar(self.value + other.value)
+
+    def __eqsame__(self, other):
+        return self.value == other.value
+
+
+class SubScalar(Scalar):
+    __slots__ = ()
+
+
+class MyInt(int):
+    pass
+
+
+class Vector(Parametric):
+    __parameters__ = [int, type]
+
+
+def run(scale=1.0):
+    """Yield (case, time per operation, 's')."""
+
+    number = max(1, int(20000 * scale))
+    add, eq = op.add, op.eq
+    a, b, c = Scalar(1), Scalar(2), SubScalar(1)
+
+    yield 'op/add/same', best_time(lambda: add(a, b), number), 's'
+    yield 'op/add/operator', best_time(lambda: a + b, number), 's'
+    yield 'op/eq/same', best_time(lambda: eq(a, b), number), 's'
+    yield 'op/eq/subclass', best_time(lambda: eq(a, c), number), 's'
+
+    def convert_error():
+        try:
+            convert('1', float)
+        except TypeError:
+            pass
+
+    x = MyInt(1)
+    yield 'convert/direct', best_time(lambda: convert(1, float), number), 's'
+    yield 'convert/same', best_time(lambda: convert(1.0, float), number), 's'
+    yield 'convert/chain', best_time(lambda: convert(x, float), number), 's'
+    yield 'convert/error', best_time(convert_error, number), 's'
+
+    yield 'promote/pair', best_time(lambda: promote(1, 2.0), number), 's'
+    yield 'promote/subclass', best_time(lambda: promote(x, 2.0), number), 's'
+
+    # Time per value of the promotion of long lists of arguments
+    for size in [100, 10000, 1000000]:
+        n = max(12, int(size * scale))
+        values = [1, True, 2.0] * (n // 3)
+        t = best_time(lambda: promote(*values), 1, 3) / len(values)
+        yield 'promote/values/%s' % size, t, 's'
+
+    # Time per value of the conversion of sequences
+    n = max(12, int(1000000 * scale))
+    values = list(range(n))
+    yield ('convert_many/list',
+           best_time(lambda: convert_many(values, float), 1, 3) / n, 's')
+    if numpy is not None:
+        array = numpy.arange(n)
+        yield ('convert_many/array',
+               best_time(lambda: convert_many(array, float), 1, 3) / n, 's')
+
+    yield ('promote_type',
+           best_time(lambda: promote_type(int, float), number), 's')
+
+    Vector[2, float]
+    yield ('parametric/getitem',
+           best_time(lambda: Vector[2, float], number), 's')
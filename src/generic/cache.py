@@ -0,0 +1,644 @@
+"""
+Caches used to store the methods resolved by the dispatch algorithm.
+
+By default, generic functions keep their cache in a regular dictionary that
+maps tuples of argument types to implementations. This dictionary grows
+without bound, which can be a problem when types are created on the fly (e.g.,
+parametric types). The bounded caches implemented here hold at most
+``maxsize`` entries and keep statistics about their usage. WeakTypeCache holds
+only weak references to the types and forgets entries whose types were
+garbage collected. CompactCache stores very large tables using a fraction of
+the memory of a dictionary.
+
+Bounded caches update their bookkeeping on every read, so all their operations
+are protected by a lock. WeakTypeCache uses a lock only to serialize writes.
+"""
+
+import array
+import collections
+import sys
+import threading
+import weakref
+from collections.abc import MutableMapping
+
+__all__ = [
+    'CacheInfo', 'BoundedCache', 'LRUCache', 'LFUCache', 'WeakTypeCache',
+    'CompactCache', 'make_cache', 'cache_nbytes',
+]
+
+
+CacheInfo = collections.namedtuple(
+    'CacheInfo', ['hits', 'misses', 'evictions', 'maxsize', 'currsize'])
+
+
+class BoundedCache(MutableMapping):
+
+    """Base class for caches that hold at most maxsize entries.
+
+    Subclasses must store their data in the ``_data`` dictionary and implement
+    the eviction policy in __getitem__ and __setitem__.
+    """
+
+    policy = None
+
+    def __init__(self, maxsize, data=()):
+        if maxsize is None or maxsize < 1:
+            raise ValueError('maxsize must be a positive integer, got %r' %
+                             maxsize)
+        self.maxsize = maxsize
+        self.hits = self.misses = self.evictions = 0
+        self._lock = threading.RLock()
+        self.update(data)
+
+    def __repr__(self):
+        tname = type(self).__name__
+        return '<%s with %s/%s entries>' % (tname, len(self), self.maxsize)
+
+    def __contains__(self, key):
+        # Membership tests do not count as hits or misses
+        return key in self._data
+
+    def __iter__(self):
+        # Lookups reorder the entries of LRU caches
+        with self._lock:
+            keys = list(self._data)
+        return iter(keys)
+
+    def __len__(self):
+        return len(self._data)
+
+    def info(self):
+        """Return a CacheInfo named tuple with usage statistics."""
+
+        return CacheInfo(self.hits, self.misses, self.evictions,
+                         self.maxsize, len(self))
+
+
+class LRUCache(BoundedCache):
+
+    """A cache that evicts the least recently used entry when full.
+
+    Example
+    -------
+
+    >>> cache = LRUCache(2)
+    >>> cache['a'] = 1; cache['b'] = 2
+    >>> cache['a']
+    1
+    >>> cache['c'] = 3
+    >>> sorted(cache)
+    ['a', 'c']
+    """
+
+    policy = 'lru'
+
+    def __init__(self, maxsize, data=()):
+        self._data = collections.OrderedDict()
+        super(LRUCache, self).__init__(maxsize, data)
+
+    def __getitem__(self, key):
+        data = self._data
+        with self._lock:
+            try:
+                value = data[key]
+            except KeyError:
+                self.misses += 1
+                raise
+            data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def __setitem__(self, key, value):
+        data = self._data
+        with self._lock:
+            if key in data:
+                data.move_to_end(key)
+            elif len(data) >= self.maxsize:
+                data.popitem(last=False)
+                self.evictions += 1
+            data[key] = value
+
+    def __delitem__(self, key):
+        with self._lock:
+            del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class LFUCache(BoundedCache):
+
+    """A cache that evicts the least frequently used entry when full. Ties are
+    broken by evicting the least recently used entry.
+
+    Example
+    -------
+
+    >>> cache = LFUCache(2)
+    >>> cache['a'] = 1; cache['b'] = 2
+    >>> cache['a'], cache['a'], cache['b']
+    (1, 1, 2)
+    >>> cache['c'] = 3
+    >>> sorted(cache)
+    ['a', 'c']
+    """
+
+    policy = 'lfu'
+
+    def __init__(self, maxsize, data=()):
+        self._data = {}
+        self._counts = {}
+        self._buckets = {}
+        self._mincount = 0
+        super(LFUCache, self).__init__(maxsize, data)
+
+    def __getitem__(self, key):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                raise
+            self.hits += 1
+            self._touch(key)
+            return value
+
+    def __setitem__(self, key, value):
+        data = self._data
+        with self._lock:
+            if key in data:
+                data[key] = value
+                self._touch(key)
+                return
+
+            if len(data) >= self.maxsize:
+                bucket = self._buckets[self._mincount]
+                old, _ = bucket.popitem(last=False)
+                if not bucket:
+                    del self._buckets[self._mincount]
+                del data[old]
+                del self._counts[old]
+                self.evictions += 1
+
+            data[key] = value
+            self._counts[key] = 1
+            self._bucket(1)[key] = None
+            self._mincount = 1
+
+    def __delitem__(self, key):
+        with self._lock:
+            del self._data[key]
+            count = self._counts.pop(key)
+            self._discard(key, count)
+            if count == self._mincount and count not in self._buckets:
+                self._mincount = min(self._buckets) if self._buckets else 0
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._counts.clear()
+            self._buckets.clear()
+            self._mincount = 0
+
+    def _bucket(self, count):
+        try:
+            return self._buckets[count]
+        except KeyError:
+            bucket = self._buckets[count] = collections.OrderedDict()
+            return bucket
+
+    def _discard(self, key, count):
+        bucket = self._buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[count]
+
+    def _touch(self, key):
+        count = self._counts[key]
+        self._discard(key, count)
+        if count == self._mincount and count not in self._buckets:
+            self._mincount = count + 1
+        self._counts[key] = count + 1
+        self._bucket(count + 1)[key] = None
+
+
+def _weak_key(key):
+    """Return the tuple of weak references used to look up key in a
+    WeakTypeCache. Raise KeyError if key is not a tuple of types."""
+
+    try:
+        return tuple(map(weakref.ref, key))
+    except TypeError:
+        raise KeyError(key) from None
+
+
+class WeakTypeCache(MutableMapping):
+
+    """A cache keyed by tuples of types that holds only weak references to the
+    types. Entries are purged automatically when one of their types is garbage
+    collected.
+
+    Values are stored normally: an implementation that references one of its
+    argument types keeps that type alive.
+
+    Example
+    -------
+
+    >>> import gc
+    >>> cache = WeakTypeCache()
+    >>> A = type('A', (), {})
+    >>> cache[A, int] = 'method'
+    >>> len(cache)
+    1
+    >>> del A; _ = gc.collect()
+    >>> len(cache), cache.purged
+    (0, 1)
+    """
+
+    def __init__(self, data=()):
+        self._data = {}
+        self._owners = {}
+        self._lock = threading.RLock()
+        self.purged = 0
+
+        # The callback holds only a weak reference to the cache
+        selfref = weakref.ref(self)
+
+        def remove(ref):
+            self = selfref()
+            if self is not None:
+                self._purge(ref)
+        self._remove = remove
+        self.update(data)
+
+    def __repr__(self):
+        return '<WeakTypeCache with %s entries>' % len(self)
+
+    def __getitem__(self, key):
+        return self._data[_weak_key(key)][1]
+
+    def __contains__(self, key):
+        try:
+            return _weak_key(key) in self._data
+        except KeyError:
+            return False
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            try:
+                stored, _ = self._data[tuple(map(weakref.ref, key))]
+            except KeyError:
+                remove = self._remove
+                stored = tuple([weakref.ref(T, remove) for T in key])
+                for ref in stored:
+                    self._owners[id(ref)] = stored
+            self._data[stored] = (stored, value)
+
+    def __delitem__(self, key):
+        with self._lock:
+            stored, _ = self._data.pop(_weak_key(key))
+            for ref in stored:
+                self._owners.pop(id(ref), None)
+
+    def __iter__(self):
+        for stored in list(self._data):
+            key = tuple([ref() for ref in stored])
+            if None not in key:
+                yield key
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._owners.clear()
+
+    def info(self):
+        """Return a CacheInfo named tuple. Purged entries are reported as
+        evictions."""
+
+        return CacheInfo(None, None, self.purged, None, len(self))
+
+    def _purge(self, ref):
+        """Remove the entry that owns the given dead reference"""
+
+        with self._lock:
+            stored = self._owners.pop(id(ref), None)
+            if stored is None:
+                return
+            self._data.pop(stored, None)
+            for ref in stored:
+                self._owners.pop(id(ref), None)
+            self.purged += 1
+
+
+class CompactCache(MutableMapping):
+
+    """An unbounded cache that uses much less memory than a dictionary for
+    very large numbers of entries.
+
+    A dictionary keeps a tuple of types for each entry, plus the hash, key
+    and value pointers of its slot. CompactCache keeps one hash table for
+    each number of arguments. Each entry stores only the ids of the argument
+    types in an array of integers and a pointer to the implementation. The
+    types themselves are interned with a reference count that keeps them
+    alive while they are used by some entry, as the keys of a dictionary
+    would. Keys are rebuilt from the type ids during iteration.
+
+    Lookups are done in Python and are slower than dictionary lookups, but
+    they only happen when the inline caches of the generic function miss.
+    Reads do not acquire any lock.
+
+    Example
+    -------
+
+    >>> cache = CompactCache()
+    >>> cache[int, float] = 'method'
+    >>> cache[int, float], (float, int) in cache
+    ('method', False)
+    >>> list(cache)
+    [(<class 'int'>, <class 'float'>)]
+    """
+
+    def __init__(self, data=()):
+        self._tables = {}
+        self._types = {}
+        self._lock = threading.RLock()
+        self.update(data)
+
+    def __repr__(self):
+        return '<CompactCache with %s entries>' % len(self)
+
+    def __getitem__(self, key):
+        try:
+            table = self._tables[len(key)]
+        except KeyError:
+            raise KeyError(key)
+        value = table.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except (KeyError, TypeError):
+            return False
+        return True
+
+    def __setitem__(self, key, value):
+        if value is None:
+            raise ValueError('cannot store None')
+        key = tuple(key)
+        with self._lock:
+            table = self._tables.get(len(key))
+            if table is None:
+                table = _CompactTable(len(key), self._types)
+                self._tables[len(key)] = table
+            if table.set(key, value):
+                self._intern(key)
+
+    def __delitem__(self, key):
+        with self._lock:
+            try:
+                table = self._tables[len(key)]
+            except KeyError:
+                raise KeyError(key)
+            if not table.delete(key):
+                raise KeyError(key)
+            self._release(key)
+
+    def __iter__(self):
+        types = self._types
+        for table in list(self._tables.values()):
+            for ids in table.keys():
+                yield tuple([types[i][0] for i in ids])
+
+    def __len__(self):
+        return sum(table.size for table in self._tables.values())
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
+            self._types.clear()
+
+    def nbytes(self):
+        """Return an estimate of the memory used by the cache, in bytes."""
+
+        size = sys.getsizeof(self) + sys.getsizeof(self._tables)
+        size += sys.getsizeof(self._types)
+        size += sum(sys.getsizeof(ref) for ref in self._types.values())
+        for table in self._tables.values():
+            size += table.nbytes()
+        return size
+
+    def _intern(self, key):
+        types = self._types
+        for T in key:
+            try:
+                types[id(T)][1] += 1
+            except KeyError:
+                types[id(T)] = [T, 1]
+
+    def _release(self, key):
+        types = self._types
+        for T in key:
+            ref = types[id(T)]
+            ref[1] -= 1
+            if ref[1] == 0:
+                del types[id(T)]
+
+
+class _CompactTable(object):
+
+    """Hash table for keys with a fixed number of types, laid out as the
+    dictionaries of CPython.
+
+    The ``data`` attribute is an (index, ids, values) tuple. Entries are
+    appended to the dense ``ids`` and ``values`` arrays: entry e uses
+    ids[e * arity:(e + 1) * arity] and values[e]. The sparse ``index`` array
+    maps hash slots to entries, with linear probing. It stores EMPTY in free
+    slots and DELETED in slots of removed entries.
+
+    The ids of an entry never change, and removed entries are marked by a
+    None value, so readers that do not hold the lock never see an
+    inconsistent entry. New entries are written before their index slot.
+    Removed entries are dropped when the table is resized, and the data tuple
+    is then replaced as a whole."""
+
+    __slots__ = ('arity', 'size', 'used', 'types', 'data')
+
+    def __init__(self, arity, types):
+        self.arity = arity
+        self.size = 0
+        self.used = 0
+        self.types = types
+        self.data = (array.array('i', [EMPTY] * 8), array.array('q'), [])
+
+    def get(self, key):
+        """Return the value for key or None."""
+
+        n = self.arity
+        index, ids, values = self.data
+        mask = len(index) - 1
+        i = hash(key) & mask
+        while True:
+            e = index[i]
+            if e == EMPTY:
+                return None
+            if e >= 0:
+                base = e * n
+                for k in range(n):
+                    if ids[base + k] != id(key[k]):
+                        break
+                else:
+                    return values[e]
+            i = (i + 1) & mask
+
+    def set(self, key, value):
+        """Store value and return True if key is a new entry."""
+
+        if 3 * (self.used + 1) > 2 * len(self.data[0]):
+            self._resize()
+        index, ids, values = self.data
+        slot, e = self._find(key)
+        if e >= 0:
+            values[e] = value
+            return False
+
+        ids.extend([id(T) for T in key])
+        values.append(value)
+        if index[slot] == EMPTY:
+            self.used += 1
+        index[slot] = len(values) - 1
+        self.size += 1
+        return True
+
+    def delete(self, key):
+        """Remove key and return True if it was present."""
+
+        index, ids, values = self.data
+        slot, e = self._find(key)
+        if e < 0:
+            return False
+        values[e] = None
+        index[slot] = DELETED
+        self.size -= 1
+        return True
+
+    def keys(self):
+        """Yield tuples with the type ids of all keys."""
+
+        n = self.arity
+        index, ids, values = self.data
+        for e, value in enumerate(values):
+            if value is not None:
+                yield tuple(ids[e * n:(e + 1) * n])
+
+    def nbytes(self):
+        return sys.getsizeof(self) + sum(map(sys.getsizeof, self.data))
+
+    def _find(self, key):
+        """Return (slot, entry) for an existing key or (free slot, -1)."""
+
+        n = self.arity
+        index, ids, values = self.data
+        mask = len(index) - 1
+        keyids = [id(T) for T in key]
+        i = hash(key) & mask
+        free = None
+        while True:
+            e = index[i]
+            if e == EMPTY:
+                return (i if free is None else free), -1
+            if e == DELETED:
+                if free is None:
+                    free = i
+            elif ids[e * n:(e + 1) * n].tolist() == keyids:
+                return i, e
+            i = (i + 1) & mask
+
+    def _resize(self):
+        n = self.arity
+        capacity = 8
+        while 3 * (self.size + 1) > capacity:
+            capacity *= 2
+        mask = capacity - 1
+        types = self.types
+        old_index, old_ids, old_values = self.data
+        index = array.array('i', [EMPTY] * capacity)
+        ids = array.array('q')
+        values = []
+        for e, value in enumerate(old_values):
+            if value is None:
+                continue
+            keyids = old_ids[e * n:(e + 1) * n]
+            i = hash(tuple([types[x][0] for x in keyids])) & mask
+            while index[i] != EMPTY:
+                i = (i + 1) & mask
+            index[i] = len(values)
+            ids.extend(keyids)
+            values.append(value)
+
+        # Readers may hold the old arrays, which are never modified again
+        self.data = (index, ids, values)
+        self.used = len(values)
+
+
+EMPTY = -1
+DELETED = -2
+
+
+CACHE_POLICIES = {
+    'lru': LRUCache,
+    'lfu': LFUCache,
+}
+
+
+def make_cache(maxsize=None, policy='lru', weak=False, compact=False):
+    """Return a new cache object for a generic function.
+
+    An unbounded cache (maxsize=None) is a regular dictionary. Otherwise,
+    return a bounded cache with the given eviction policy ('lru' or 'lfu').
+    If weak=True, return a WeakTypeCache, which cannot be bounded. If
+    compact=True, return an unbounded CompactCache."""
+
+    try:
+        cls = CACHE_POLICIES[policy]
+    except KeyError:
+        raise ValueError('invalid cache policy: %r' % policy)
+    if compact:
+        if maxsize is not None or weak:
+            raise ValueError('compact caches cannot be bounded or weak')
+        return CompactCache()
+    if weak:
+        if maxsize is not None:
+            raise ValueError('weak caches cannot be bounded')
+        return WeakTypeCache()
+    if maxsize is None:
+        return {}
+    return cls(maxsize)
+
+
+def cache_nbytes(cache):
+    """Return an estimate of the memory used by a cache, in bytes.
+
+    The estimate includes the containers and the tuples used as keys, but not
+    the types and implementations they refer to. Caches can provide their
+    own estimate by implementing a nbytes() method."""
+
+    nbytes = getattr(cache, 'nbytes', None)
+    if nbytes is not None:
+        return nbytes()
+
+    size = sys.getsizeof(cache)
+    for attr in ['_data', '_counts', '_owners']:
+        data = getattr(cache, attr, None)
+        if data is not None:
+            size += sys.getsizeof(data)
+    for bucket in getattr(cache, '_buckets', {}).values():
+        size += sys.getsizeof(bucket)
+    size += sum(sys.getsizeof(key) for key in list(cache))
+    return size
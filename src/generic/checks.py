@@ -0,0 +1,123 @@
+"""
+Type checking wrappers for the methods of generic functions.
+
+Generic functions created with ``typecheck='instance'`` or
+``typecheck='strict'`` wrap each registered method in a function that checks
+the types of the arguments against the declared signature and the type of the
+return value against the declared restype.
+
+Wrappers are generated as Python source for each signature. They take exactly
+as many positional arguments as the signature and the checks are unrolled
+into a sequence of isinstance() calls (or identity tests, in strict mode), so
+the overhead is a few tests per call::
+
+    >>> def add(x, y):
+    ...     return x + y
+    >>> add_checked = checked(add, (int, int), restype=int)
+    >>> add_checked(1, 2)
+    3
+    >>> add_checked(1, 2.0)
+    Traceback (most recent call last):
+    ...
+    TypeError: add() argument 2 must be int, got float
+
+Arguments declared as object are not checked. Keyword arguments are passed
+unchanged to the wrapped function.
+"""
+
+import functools
+import keyword
+from .util import tname
+
+__all__ = ['checked']
+
+TYPECHECK_MODES = (None, 'instance', 'strict')
+
+
+def checked(func, argtypes, restype=None, strict=False, argnames=None):
+    """Return a wrapper of func that checks the types of the positional
+    arguments and of the return value.
+
+    Parameters
+    ----------
+
+    func : callable
+        Function to be wrapped.
+    argtypes : tuple of types
+        Declared types of the positional arguments. The wrapper accepts
+        exactly len(argtypes) positional arguments.
+    restype : type
+        Declared type of the return value. It is not checked if None or
+        object.
+    strict : bool
+        If True, the types of the arguments and of the return value must be
+        exactly the declared types. Subclasses are rejected.
+    argnames : sequence of str
+        Names of the arguments of the wrapper. Use it if the arguments may be
+        passed by keyword.
+    """
+
+    names = _argument_names(len(argtypes), argnames)
+    namespace = {
+        '_func': func,
+        '_type': type,
+        '_isinstance': isinstance,
+        '_argument_error': _argument_error,
+        '_return_error': _return_error,
+    }
+    check = ('_type(%s) is not %s' if strict else
+             'not _isinstance(%s, %s)')
+
+    lines = ['def checked(%s):' % ', '.join(names + ['**_kwds'])]
+    for i, (name, T) in enumerate(zip(names, argtypes)):
+        if T is object:
+            continue
+        Tname = '_T%s' % i
+        namespace[Tname] = T
+        lines.append('    if %s:' % check % (name, Tname))
+        lines.append('        _argument_error(_func, %s, %s, %s)' %
+                     (i, name, Tname))
+    call = '_func(%s)' % ', '.join(names + ['**_kwds'])
+    if restype is None or restype is object:
+        lines.append('    return ' + call)
+    else:
+        namespace['_R'] = restype
+        lines.append('    _out = ' + call)
+        lines.append('    if %s:' % check % ('_out', '_R'))
+        lines.append('        _return_error(_func, _out, _R)')
+        lines.append('    return _out')
+
+    exec(_compile('\n'.join(lines)), namespace)
+    wrapper = namespace['checked']
+    functools.update_wrapper(wrapper, func)
+    return wrapper
+
+
+@functools.lru_cache(maxsize=256)
+def _compile(source):
+    # Many methods share the same shape of wrapper. Only the namespace with
+    # the function and the types changes between them.
+    return compile(source, '<generic.checks>', 'exec')
+
+
+def _argument_names(n, argnames):
+    if argnames is not None and len(argnames) >= n:
+        names = list(argnames[:n])
+        if all(_is_valid_name(name) for name in names):
+            return names
+    return ['_%s' % i for i in range(n)]
+
+
+def _is_valid_name(name):
+    return (name.isidentifier() and not keyword.iskeyword(name) and
+            not name.startswith('_'))
+
+
+def _argument_error(func, i, x, T):
+    fmt = getattr(func, '__name__', 'function'), i + 1, T.__name__, tname(x)
+    raise TypeError('%s() argument %s must be %s, got %s' % fmt)
+
+
+def _return_error(func, x, T):
+    fmt = getattr(func, '__name__', 'function'), T.__name__, tname(x)
+    raise TypeError('%s() must return %s, got %s' % fmt)
@@ -1,15 +1,33 @@
 """
 Conversion and promotion between types.
+
+Conversions registered with set_conversion() form a graph whose nodes are
+types. When there is no direct conversion between two types,
+get_conversion() searches the cheapest chain of registered conversions and
+composes it into a single function. Conversions registered for a type also
+apply to its subclasses.
+
+The results of get_conversion() and get_promotion() that require a search,
+including failures, are cached per pair of types. The caches are cleared
+by set_conversion(), set_promotion() and set_promotion_rule() and when a
+class is registered in some ABC.
+
+convert_many() and promote_arrays() work on whole sequences. They resolve
+conversions once for each distinct type and use NumPy casts for arrays.
 """
+import heapq
+import itertools
+import sys
 from . import ABCMeta
+from .abccache import _abc_token
 from .errors import InexactError
 __all__ = [
     # Conversions
-    'convert', 'get_conversion', 'set_conversion',
+    'convert', 'get_conversion', 'set_conversion', 'convert_many',
 
     # Promotions
     'promote', 'get_promotion', 'set_promotion', 'set_promotion_rule',
-    'promote_type',
+    'promote_type', 'promote_arrays',
 ]
 
 # In Python 2 we have to handle new style vs old style classes
@@ -25,6 +43,19 @@ Type = tuple(Type)
 #
 CONVERT_FUNCTIONS = {}
 
+# Maps each type to a list of (to_type, function, cost, chain) for the
+# conversions registered from it
+CONVERT_GRAPH = {}
+
+# Maps (from_type, to_type) pairs that are not in CONVERT_FUNCTIONS to the
+# conversions found by get_conversion() or to an error message
+CONVERT_PATHS = {}
+
+# Caches are emptied when they reach this size
+CACHE_MAXSIZE = 4096
+_cache_token = [None]
+_missing = object()
+
 
 def _do_nothing(x):
     """A function that does nothing and returns its argument"""
@@ -64,31 +95,137 @@ def convert(value, T):
 
 def get_conversion(from_type, to_type):
     """Return a function that converts from input type to the given output
-    type"""
+    type.
 
-    # Look up in dictionary
-    try:
-        return CONVERT_FUNCTIONS[from_type, to_type]
-    except KeyError:
-        try:
-            if issubclass(to_type, from_type):
-                return _do_nothing
-        except TypeError:
-            raise ValueError('not types: %r, %r' % (from_type, to_type))
+    Conversions are looked up in the following order: conversions registered
+    for the pair of types, the identity if from_type is a subclass of
+    to_type and chains of registered conversions.
+
+    Examples
+    --------
+
+    >>> class Celsius(float): pass
+    >>> class Kelvin(float): pass
+    >>> class Fahrenheit(float): pass
+    >>> set_conversion(Celsius, Kelvin, lambda x: Kelvin(x + 273.15))
+    >>> set_conversion(Fahrenheit, Celsius, lambda x: Celsius((x - 32) / 1.8))
+    >>> get_conversion(Fahrenheit, Kelvin)(Fahrenheit(212))
+    373.15
+    """
+
+    # Look up in dictionary. Failed lookups are common, so we avoid the cost
+    # of handling KeyErrors.
+    key = (from_type, to_type)
+    converter = CONVERT_FUNCTIONS.get(key)
+    if converter is not None:
+        return converter
+    if _cache_token[0] != _abc_token():
+        _clear_caches()
+    converter = CONVERT_PATHS.get(key, _missing)
+    if converter.__class__ is str:
+        raise TypeError(converter)
+    elif converter is not _missing:
+        return converter
 
-    # Handle key error
     if not (isinstance(from_type, Type) and isinstance(to_type, Type)):
-        print(Type)
-        fmt = type(from_type).__name__, type(to_type).__name__
         raise ValueError('not types: %r, %r' % (from_type, to_type))
-    fmt = from_type.__name__, to_type.__name__
-    msg = "cannot convert '%s' to '%s'" % fmt
-    raise TypeError(msg)
+    if issubclass(from_type, to_type):
+        converter = _do_nothing
+    else:
+        # Search a chain of conversions
+        path = _search_conversion(from_type, to_type)
+        if path is None:
+            fmt = from_type.__name__, to_type.__name__
+            converter = "cannot convert '%s' to '%s'" % fmt
+        else:
+            converter = _compose(path)
+
+    if len(CONVERT_PATHS) >= CACHE_MAXSIZE:
+        CONVERT_PATHS.clear()
+    CONVERT_PATHS[key] = converter
+    if converter.__class__ is str:
+        raise TypeError(converter)
+    return converter
+
+
+def _clear_caches():
+    """Clear the caches of conversions and promotions."""
+
+    _cache_token[0] = _abc_token()
+    CONVERT_PATHS.clear()
+    PROMOTION_CACHE.clear()
+
+
+def _search_conversion(from_type, to_type):
+    """Return the list of functions in the cheapest chain of conversions from
+    from_type to to_type or None if there is no such chain.
+
+    This is Dijkstra's algorithm on the graph of registered conversions. A
+    type can use the conversions registered for any of its bases and reaches
+    to_type when it is a subclass of it. Ties are broken by the number of
+    conversions and then in favor of to_type itself over its subclasses.
+    Conversions registered with chain=False are only used alone, as the
+    single step to to_type."""
+
+    graph = CONVERT_GRAPH
+    counter = itertools.count()
+    queue = [(0, 0, True, 0, from_type, None)]
+    visited = set()
+    while queue:
+        cost, size, _, _, T, path = heapq.heappop(queue)
+        if T in visited:
+            continue
+        visited.add(T)
+        if issubclass(T, to_type):
+            result = []
+            while path is not None:
+                path, func = path
+                result.append(func)
+            return result[::-1]
+
+        for base in T.__mro__:
+            for (S, func, step, chain) in graph.get(base, ()):
+                if not chain and (path is not None or
+                                  not issubclass(S, to_type)):
+                    continue
+                if S not in visited:
+                    item = (cost + step, size + 1, S is not to_type,
+                            next(counter), S, (path, func))
+                    heapq.heappush(queue, item)
+    return None
+
+
+def _compose(functions):
+    """Compose a list of functions of one argument, in order."""
+
+    if len(functions) == 1:
+        return functions[0]
+    elif len(functions) == 2:
+        f, g = functions
+
+        def composed(x):
+            return g(f(x))
+    else:
+        functions = tuple(functions)
+
+        def composed(x):
+            for f in functions:
+                x = f(x)
+            return x
+    return composed
 
 
-def set_conversion(from_type, to_type, function=None):
+def set_conversion(from_type, to_type, function=None, *, cost=1,
+                   chain=True):
     """Register a function that converts between the two given types.
 
+    The cost is used to choose between different chains of conversions
+    between two types. Slow conversions should have a larger cost.
+    Conversions that work only for some values (e.g., float to int) should
+    be registered with chain=False: they are never composed with other
+    conversions, which could turn a value that converts exactly into one that
+    fails or vice versa.
+
 
     Examples
     --------
@@ -109,7 +246,8 @@ def set_conversion(from_type, to_type, function=None):
     # Decorator form
     if function is None:
         def decorator(func):
-            set_conversion(from_type, to_type, func)
+            set_conversion(from_type, to_type, func, cost=cost,
+                           chain=chain)
             return func
         return decorator
 
@@ -117,8 +255,13 @@ def set_conversion(from_type, to_type, function=None):
     if (from_type, to_type) in CONVERT_FUNCTIONS:
         fmt = from_type.__name__, to_type.__name__
         raise ValueError('cannot overwrite convertion from %s to %s' % fmt)
+    if cost < 0:
+        raise ValueError('cost must be non-negative')
 
     CONVERT_FUNCTIONS[from_type, to_type] = function
+    edge = (to_type, function, cost, chain)
+    CONVERT_GRAPH.setdefault(from_type, []).append(edge)
+    _clear_caches()
 
 
 #
@@ -127,6 +270,14 @@ def set_conversion(from_type, to_type, function=None):
 PROMOTION_FUNCTIONS = {}
 PROMOTION_RULES = {}
 
+# Maps pairs of types that are not in PROMOTION_FUNCTIONS to the promotions
+# found by _compute_promotions() or to an error message
+PROMOTION_CACHE = {}
+
+# Maps the promotion functions created by set_promotion_rule() to their
+# common type. Only these promotions are simple conversions to a common type.
+SIMPLE_PROMOTIONS = {}
+
 
 def promote(x, y, *args):
     """Promote x and y to a common type.
@@ -179,6 +330,43 @@ def _promote_values(*args):
     (1.0, 2.0, 3.0)
     """
 
+    # Compute the common type from the distinct types of the arguments, in
+    # order of appearance, and convert each argument once
+    types = list(dict.fromkeys(map(type, args)))
+    if len(types) == 1:
+        return args
+    converters = _simple_converters(types)
+    if converters is None:
+        return _promote_pairwise(args)
+    T, converters = converters
+    return tuple([x if type(x) is T else converters[type(x)](x)
+                  for x in args])
+
+
+def _simple_converters(types):
+    """Return the common type T of the given list of types and a dictionary
+    mapping the other types to their conversions to T.
+
+    Return None if some promotion between the types was not defined by
+    set_promotion_rule(), since other promotions are not simple conversions
+    to a common type."""
+
+    try:
+        T = types[0]
+        for S in types[1:]:
+            if S is not T:
+                T = SIMPLE_PROMOTIONS.get(get_promotion(T, S))
+                if T is None:
+                    return None
+        return T, {S: get_conversion(S, T) for S in types if S is not T}
+    except TypeError:
+        return None
+
+
+def _promote_pairwise(args):
+    """Promote values by applying promote() to all consecutive pairs of
+    arguments, forth and back."""
+
     elements = iter(args)
     out = [next(elements)]
 
@@ -204,22 +392,44 @@ def get_promotion(T1, T2):
     Raises a TypeError if no promotion function is found"""
 
     # Check the promotions dictionary
-    try:
-        return PROMOTION_FUNCTIONS[T1, T2]
-    except KeyError:
-        pass
+    key = (T1, T2)
+    promotion = PROMOTION_FUNCTIONS.get(key)
+    if promotion is not None:
+        return promotion
 
     # Check if types are the same
     if T1 is T2:
         return T1
 
+    # Check promotions computed before. Failures are common when promotions
+    # are probed with try/except.
+    if _cache_token[0] != _abc_token():
+        _clear_caches()
+    promotion = PROMOTION_CACHE.get(key, _missing)
+    if promotion.__class__ is str:
+        raise TypeError(promotion)
+    elif promotion is not _missing:
+        return promotion
+
     # Look for a promotion rule for a base type
-    return _compute_promotions(T1, T2)
+    try:
+        promotion = _compute_promotions(T1, T2)
+    except TypeError as ex:
+        promotion = str(ex)
+    if len(PROMOTION_CACHE) >= CACHE_MAXSIZE:
+        PROMOTION_CACHE.clear()
+    PROMOTION_CACHE[key] = promotion
+    if promotion.__class__ is str:
+        raise TypeError(promotion)
+    return promotion
 
 
 def _compute_promotions(T1, T2):
     """Compute the valid promotions for types T1 and T2, assuming they are not
-    present in the PROMOTION_FUNCTIONS dictionary."""
+    present in the PROMOTION_FUNCTIONS dictionary.
+
+    This function walks the MROs of both types. Its results are cached by
+    get_promotion()."""
 
     rules = PROMOTION_FUNCTIONS
     valid = []
@@ -240,7 +450,13 @@ def _compute_promotions(T1, T2):
 
             return promotion
         elif issubclass(T2, T1):
-            return get_promotion(T2, T1)
+            reverse = get_promotion(T2, T1)
+
+            def promotion(x, y):
+                y, x = reverse(y, x)
+                return x, y
+
+            return promotion
         else:
             aux = (T1.__name__, T2.__name__)
             raise TypeError('no promotion rule found for %s and %s' % aux)
@@ -252,7 +468,6 @@ def _compute_promotions(T1, T2):
 
     # A single promotion was found
     else:
-        # TODO: cache it?
         return rules[valid[0]]
 
 
@@ -306,6 +521,7 @@ def set_promotion(T1, T2, *,
             return x, y
         PROMOTION_FUNCTIONS[T2, T1] = reverse_function
         PROMOTION_RULES[T2, T1] = restype
+    _clear_caches()
 
 
 def set_promotion_rule(T1, T2, T3):
@@ -356,8 +572,11 @@ def set_promotion_rule(T1, T2, T3):
 
     PROMOTION_FUNCTIONS[T1, T2] = promote_direct
     PROMOTION_FUNCTIONS[T2, T1] = promote_reverse
+    SIMPLE_PROMOTIONS[promote_direct] = T3
+    SIMPLE_PROMOTIONS[promote_reverse] = T3
     PROMOTION_RULES[T1, T2] = T3
     PROMOTION_RULES[T2, T1] = T3
+    _clear_caches()
 
 
 def promote_type(T1, T2):
@@ -375,6 +594,215 @@ def promote_type(T1, T2):
             raise TypeError('no promotion rule for (%s, %s)' % fmt)
 
 
+#
+# Conversion and promotion of sequences
+#
+def convert_many(values, T):
+    """Convert all values in a sequence to the type T.
+
+    Conversions are resolved once for each distinct type of the values.
+    NumPy arrays are converted with a single cast if T corresponds to a
+    numeric dtype and the result is also an array. Other iterables are
+    converted to lists.
+
+    Conversions that would lose information raise an InexactError whose
+    ``index`` attribute tells the position of the first offending value.
+
+    Examples
+    --------
+
+    >>> convert_many([1, 2.0, True], float)
+    [1.0, 2.0, 1.0]
+    >>> convert_many([1, 2.5], int)
+    Traceback (most recent call last):
+    ...
+    generic.errors.InexactError: cannot convert 2.5 to int at index 1
+    """
+
+    if _is_array(values):
+        return _convert_array(values, T)
+
+    result = []
+    append = result.append
+    converters = {}
+    for i, x in enumerate(values):
+        S = type(x)
+        if S is T:
+            append(x)
+            continue
+        try:
+            converter = converters[S]
+        except KeyError:
+            converter = converters[S] = _get_converter(S, T, x, i)
+        try:
+            append(converter(x))
+        except InexactError:
+            raise _inexact_error(x, T, i)
+    return result
+
+
+def promote_arrays(*sequences):
+    """Promote all values in the given sequences to a common type.
+
+    Return a tuple with the converted sequences. If all sequences are NumPy
+    arrays of numeric dtypes, the common dtype is computed by NumPy and the
+    results are arrays. Otherwise, the common type is computed from the
+    distinct types of the values as in promote().
+
+    Examples
+    --------
+
+    >>> promote_arrays([1, 2], [3.0, True])
+    ([1.0, 2.0], [3.0, 1.0])
+    """
+
+    if sequences and all(_is_numeric_array(x) for x in sequences):
+        numpy = sys.modules['numpy']
+        dtype = numpy.result_type(*sequences)
+        return tuple(x.astype(dtype, copy=False) for x in sequences)
+
+    sequences = [x if _is_array(x) else list(x) for x in sequences]
+    types = {}
+    for seq in sequences:
+        types.update(dict.fromkeys(_element_types(seq)))
+    types = list(types)
+    if not types:
+        return tuple(list(seq) for seq in sequences)
+
+    # Promotions that are not simple conversions to a common type are done
+    # value by value
+    converters = _simple_converters(types)
+    if converters is None:
+        values = _promote_values(*itertools.chain(*[
+            x.tolist() if _is_array(x) else x for x in sequences]))
+        result, start = [], 0
+        for seq in sequences:
+            result.append(list(values[start:start + len(seq)]))
+            start += len(seq)
+        return tuple(result)
+    return tuple(convert_many(seq, converters[0]) for seq in sequences)
+
+
+def _get_converter(S, T, x, i):
+    """Return a function that converts values of type S to T as convert()
+    does. The value x at index i is used in error messages."""
+
+    try:
+        return get_conversion(S, T)
+    except TypeError as ex:
+        if isinstance(x, T):
+            return _do_nothing
+        raise TypeError('%s (at index %s)' % (ex, i)) from None
+
+
+def _inexact_error(x, T, index):
+    fmt = x, getattr(T, '__name__', T), index
+    ex = InexactError('cannot convert %r to %s at index %s' % fmt)
+    ex.index = index
+    return ex
+
+
+def _is_array(x):
+    # We do not import NumPy: arrays can only exist if it was imported
+    numpy = sys.modules.get('numpy')
+    return numpy is not None and isinstance(x, numpy.ndarray)
+
+
+def _is_numeric_array(x):
+    return _is_array(x) and x.dtype.kind in 'biufc'
+
+
+def _element_types(seq):
+    """Return the distinct Python types of the values in a sequence."""
+
+    if _is_numeric_array(seq):
+        return [type(seq.dtype.type(0).item())] if seq.size else []
+    if _is_array(seq):
+        seq = seq.ravel().tolist()
+    return list(dict.fromkeys(map(type, seq)))
+
+
+def _convert_array(array, T):
+    """Implements convert_many() for NumPy arrays."""
+
+    numpy = sys.modules['numpy']
+    try:
+        dtype = numpy.dtype(T)
+    except TypeError:
+        dtype = None
+    numeric = dtype is not None and dtype.kind in 'biufc'
+    if not (numeric and array.dtype.kind in 'biufc'):
+        result = convert_many(array.ravel().tolist(), T)
+        out = numpy.empty(len(result), dtype=dtype if numeric else object)
+        out[:] = result
+        return out.reshape(array.shape)
+
+    # Complex values are converted to real types only if the conversion of
+    # Python scalars exists and the imaginary parts are zero
+    if array.dtype.kind == 'c' and dtype.kind != 'c' and array.size:
+        scalar = _SCALAR_TYPES[dtype.kind]
+        _get_converter(complex, scalar, None, _array_index(array, 0))
+        wrong = array.imag != 0
+        if wrong.any():
+            index = _array_index(array, numpy.argmax(wrong))
+            raise _inexact_error(array[index].item(), T, index)
+        array = array.real
+
+    # Invalid values are detected below, so NumPy must not warn about them
+    with numpy.errstate(all='ignore'):
+        result = array.astype(dtype)
+
+    # Casts to integer or boolean types must preserve the values, as the
+    # conversions of Python scalars do. Values out of the range of the
+    # integer type may wrap around and survive the cast back, so they are
+    # checked separately.
+    if dtype.kind in 'biu' and not numpy.can_cast(array.dtype, dtype, 'safe'):
+        with numpy.errstate(all='ignore'):
+            wrong = result.astype(array.dtype) != array
+        if dtype.kind in 'iu':
+            wrong |= _out_of_range(array, dtype)
+        if wrong.any():
+            index = _array_index(array, numpy.argmax(wrong))
+            raise _inexact_error(array[index].item(), T, index)
+    return result
+
+
+def _out_of_range(array, dtype):
+    """Return a boolean array marking the values of a real array that are
+    not finite or are out of the range of the integer dtype."""
+
+    numpy = sys.modules['numpy']
+    info = numpy.iinfo(dtype)
+    if array.dtype.kind == 'f':
+        # Both bounds are exact floats
+        return (~numpy.isfinite(array) | (array < info.min) |
+                (array >= info.max + 1))
+
+    wrong = numpy.zeros(array.shape, dtype=bool)
+    if array.dtype.kind in 'iu':
+        # Bounds are converted to the source type, where they fit
+        source = numpy.iinfo(array.dtype)
+        if info.min > source.min:
+            wrong |= array < array.dtype.type(info.min)
+        if info.max < source.max:
+            wrong |= array > array.dtype.type(info.max)
+    return wrong
+
+
+# Python scalar types for each kind of numeric dtype
+_SCALAR_TYPES = {'b': bool, 'i': int, 'u': int, 'f': float, 'c': complex}
+
+
+def _array_index(array, position):
+    """Return the index of the element at the given position of the
+    flattened array: an int for 1D arrays and a tuple otherwise."""
+
+    numpy = sys.modules['numpy']
+    index = numpy.unravel_index(position, array.shape)
+    index = tuple(int(i) for i in index)
+    return index[0] if len(index) == 1 else index
+
+
 #
 # Conversion rules
 #
@@ -386,9 +814,9 @@ set_conversion(bool, float, float)
 set_conversion(bool, complex, complex)
 
 
-@set_conversion(float, bool)
-@set_conversion(int, bool)
-@set_conversion(complex, bool)
+@set_conversion(float, bool, chain=False)
+@set_conversion(int, bool, chain=False)
+@set_conversion(complex, bool, chain=False)
 def number2bool(x):
     if x == 0:
         return False
@@ -398,9 +826,13 @@ def number2bool(x):
         raise InexactError(x)
 
 
-@set_conversion(complex, int)
-@set_conversion(float, int)
+@set_conversion(complex, int, chain=False)
+@set_conversion(float, int, chain=False)
 def number2int(x):
+    if isinstance(x, complex):
+        if x.imag:
+            raise InexactError(x)
+        x = x.real
     out = int(x)
     if out == x:
         return out
@@ -6,14 +6,31 @@ import sys
 import six
 import inspect
 import functools
+import threading
+import weakref
+from operator import attrgetter
+from time import perf_counter
 from collections import MutableMapping, Mapping
 from .errors import DispatchError, no_methods_error
-from .util import tname
+from .dispatchtree import DispatchTree, MEMO_MAXSIZE, _is_nominal
+from .cache import CacheInfo, make_cache, cache_nbytes
+from .abccache import memo_subtypecheck
+from .instrument import DispatchStats
+from .checks import checked, TYPECHECK_MODES
 
-__all__ = ['Generic', 'generic', 'overload']
+__all__ = ['Generic', 'generic', 'overload', 'all_generics', 'freeze_all',
+           'clear_caches', 'cache_memory_report']
+
+# All live generic functions, indexed by id. Generic functions are unhashable
+# mappings, so they cannot be stored in a WeakSet.
+_generics = weakref.WeakValueDictionary()
 
 
 try:
+    # The last call cache of FastCache relies on the GIL to update its fields.
+    # Free-threaded builds use the pure Python implementation instead.
+    if not getattr(sys, '_is_gil_enabled', lambda: True)():
+        raise ImportError('FastCache requires the GIL')
     from generic.core_fast import FastCache as _FastCache
     _generic_base = type('Base', (_FastCache, MutableMapping), {})
 except ImportError:
@@ -37,32 +54,116 @@ class Generic(_generic_base):
     The collection of different methods under the same generic function is
     exposed as a mapping between a tuples of types to python functions.
 
+    Cache
+    -----
+
+    Implementations resolved by the dispatch algorithm are stored in a cache
+    indexed by the tuple of argument types. By default the cache grows without
+    bound. Pass a ``maxsize`` to limit its number of entries. The ``policy``
+    argument chooses which entries are evicted when the cache is full: either
+    the least recently used ('lru') or the least frequently used ('lfu').
+
+    Generic functions that see many short lived classes can use a weak cache
+    (weak=True). It holds only weak references to the argument types and
+    entries are purged when their types are garbage collected. Methods
+    explicitly registered for a type still keep it alive.
+
+    Generic functions of many arguments that are called with a very large
+    number of different signatures can use a compact cache (compact=True).
+    It stores each entry in a few machine words instead of a tuple and a
+    dictionary slot, at the price of slower lookups when the last call cache
+    misses.
+
+    Keyword arguments
+    -----------------
+
+    By default, only positional arguments are considered by the dispatch
+    algorithm. If a sequence of argument names is given in ``argnames``,
+    keyword arguments take the place of the positional arguments with the
+    same name. The dispatch signature ends at the first argument in argnames
+    that was not given.
+
+    Dispatch keys
+    -------------
+
+    Methods are chosen from the types of the arguments. A different function
+    can be given in ``typeof`` to compute the type used to dispatch each
+    argument. It must return a type (usually a subclass of the type of the
+    argument) and should return the same object for equivalent arguments,
+    since these keys are stored in the cache as regular types. The
+    :func:`generic.keys.dtype_key` function, for instance, dispatches NumPy
+    arrays on their dtypes.
+
+    Threads
+    -------
 
+    Generic functions can be called and extended concurrently by different
+    threads. Calls that hit the cache do not acquire any lock. Cache misses
+    and registrations are serialized by a lock owned by the generic function,
+    and methods resolved concurrently with a new registration are never
+    stored in the cache. Factories are executed without holding the lock.
+
+    Frozen generic functions
+    ------------------------
+
+    Applications that register all methods at startup can call
+    :meth:`freeze` afterwards. Frozen generic functions refuse new methods,
+    so resolved implementations are never invalidated and cache misses do
+    not acquire the lock.
+
+    Type checking
+    -------------
+
+    With typecheck='instance' (or True), each method registered with a
+    signature is wrapped in a function that checks if the arguments are
+    instances of the declared types and if the return value is an instance of
+    the declared restype. With typecheck='strict', the types must match
+    exactly. Wrappers are generated for each signature (see
+    :mod:`generic.checks`) and are cheap enough to be left on outside of
+    tests. Method factories are not wrapped.
+
+    Instrumentation
+    ---------------
+
+    Call :meth:`instrument` to collect statistics about cache hits, misses
+    and the time spent in the dispatch algorithm. Generic functions that are
+    not instrumented do not pay for it.
     """
 
-    def __init__(self, name, doc=None, validate=False):
+    def __init__(self, name, doc=None, validate=False,
+                 maxsize=None, policy='lru', weak=False, argnames=None,
+                 typeof=None, compact=False, typecheck=None):
+        self._lock = threading.RLock()
+        self._epoch = 0
+        self._frozen = False
+        self._stats = None
         super(Generic, self).__init__()
         self.name = name
         self.doc = doc
-        self._cache = {}
+        self._cache = make_cache(maxsize, policy, weak, compact)
+        self._argnames = None if argnames is None else tuple(argnames)
+        self._typeof = typeof
+        self._weak = weak
         self._registry = {None: None}
+        self._tree = DispatchTree([None], weak=weak,
+                                  memo_size=maxsize or MEMO_MAXSIZE)
+        self._invalidations = {}
+        self._sites = weakref.WeakSet()
         self._last_func = None
         self._validate = validate or None
-        self.__last_types = None
-        self.__last_method = None
-
-    def __call__(self, *args, **kwds):
-        types = tuple(map(type, args))
-        try:
-            method = self._cache[types]
-        except KeyError:
-            try:
-                method = self[types]
-            except KeyError:
-                raise no_methods_error(self, types=types)
-        if method is None:
-            raise TypeError('no fallback defined for %s()' % self.__name__)
-        return method(*args, **kwds)
+        if typecheck is True:
+            typecheck = 'instance'
+        if typecheck not in TYPECHECK_MODES:
+            raise ValueError('invalid typecheck mode: %r' % typecheck)
+        self._typecheck = typecheck
+        self._cache_update()
+        _generics[id(self)] = self
+
+    # The pure Python version of __call__ delegates to a closure created by
+    # _make_caller(). Both property.__get__ and attrgetter are implemented in
+    # C, so there is no extra Python frame between the call and the closure.
+    __call__ = property(attrgetter('_call'),
+                        doc='Resolve and dispatch to best method.')
 
     def __repr__(self):
         name = self.name
@@ -171,6 +272,109 @@ class Generic(_generic_base):
         
         return mappingproxy(self._cache)
     
+    def cache_info(self):
+        """Return a CacheInfo named tuple with the number of hits, misses and
+        evictions of the type cache and its maximum and current sizes.
+
+        Statistics are only collected by bounded caches: unbounded caches
+        report hits and misses as None. Calls that repeat the argument types
+        of the previous call may be served by the last call cache and are not
+        counted."""
+
+        cache = self._cache
+        try:
+            return cache.info()
+        except AttributeError:
+            return CacheInfo(None, None, 0, None, len(cache))
+
+    def invalidations(self):
+        """Return a mapping proxy from each registered signature to the number
+        of cache entries evicted when it was registered."""
+
+        return mappingproxy(self._invalidations)
+
+    def instrument(self, enable=True):
+        """Start collecting dispatch statistics and return a
+        :class:`generic.instrument.DispatchStats` object with the counters.
+        If the generic function is already instrumented, return its current
+        statistics.
+
+        Call instrument(False) to stop collecting statistics. It returns the
+        final statistics (or None if the function was not instrumented).
+
+        Calls through sites created by bind_site() before instrumentation
+        was enabled are counted only when they miss their inline caches."""
+
+        stats = self._stats
+        if enable and stats is None:
+            self._stats = stats = DispatchStats()
+            self._cache_update()
+        elif not enable and stats is not None:
+            self._stats = None
+            self._cache_update()
+        return stats
+
+    def clear_cache(self):
+        """Remove all entries from the type cache and from the inline
+        caches. Implementations are resolved again on the next calls."""
+
+        with self._lock:
+            self._cache.clear()
+            self._tree.clear_memo()
+            for wrapped in self._registry.values():
+                factory = wrapped and wrapped[0]
+                if isinstance(factory, _MemoizedFactory):
+                    factory.clear()
+            self._reset_inline_caches()
+
+    def freeze(self):
+        """Freeze the generic function. New methods cannot be registered
+        afterwards and attempts to do so raise a RuntimeError.
+
+        Freezing resolves the implementations for all registered signatures
+        of concrete types and stores them in the cache. The cache keeps
+        growing with the new combinations of types seen in calls, but its
+        entries are never invalidated."""
+
+        with self._lock:
+            if self._frozen:
+                return
+            declared = [S for S in self._registry
+                        if S is not None and all(map(_is_nominal, S))]
+            self.warmup(declared)
+            self._frozen = True
+
+    @property
+    def frozen(self):
+        """True if the generic function is frozen."""
+
+        return self._frozen
+
+    def warmup(self, signatures):
+        """Resolve the implementations for each tuple of argument types in
+        signatures and store them in the cache.
+
+        Signatures without a valid method are skipped. Factories that return
+        NotImplemented are skipped by the dispatch algorithm as in regular
+        calls. Return the number of new cache entries.
+
+        The keys of the cache of a generic function that already handled some
+        workload can be used to warm up the cache of a fresh process (see
+        :mod:`generic.profiles`)."""
+
+        cache = self._cache
+        count = 0
+        for types in signatures:
+            types = tuple(types)
+            if types in cache:
+                continue
+            try:
+                self.dispatch(*types)
+            except TypeError:
+                continue
+            count += 1
+        return count
+
     def registry(self):
         """Return a proxy with all types explicitly registered for the generic
         function"""
@@ -188,9 +392,24 @@ class Generic(_generic_base):
         if not all(isinstance(T, type) for T in argtypes):
             raise TypeError('dispatch expect types, got: %r' % argtypes)
 
+        # The dispatch tree computes all signatures that accept argtypes
+        # without scanning the whole registry. The epoch tells if some new
+        # method was registered while we were running the factories. Frozen
+        # generics never change, so they do not need the lock.
+        stats = self._stats
+        if stats is not None:
+            start = perf_counter()
         registry = self._registry
+        frozen = self._frozen
+        if frozen:
+            parents = list(self._tree.candidates(argtypes))
+        else:
+            with self._lock:
+                epoch = self._epoch
+                parents = list(self._tree.candidates(argtypes))
+        factory_calls = 0
         while True:
-            T = dispatch(argtypes, registry, fname=self.__name__)
+            T = _most_specific(argtypes, parents, fname=self.__name__)
             wrapped = registry[T]
     
             # The None root is always present. It is assigned to None if no
@@ -200,16 +419,22 @@ class Generic(_generic_base):
     
             factory, restype = wrapped
             implementation = factory(argtypes, restype)
+            factory_calls += 1
             
             if implementation is NotImplemented:
-                if registry is self._registry:
-                    registry = dict(registry)
-                del registry[T]
+                parents = [S for S in parents if S != T]
                 continue
             break
-                
-        func = self._cache[argtypes] = implementation
-        return func
+
+        if frozen:
+            self._cache[argtypes] = implementation
+        else:
+            with self._lock:
+                if epoch == self._epoch:
+                    self._cache[argtypes] = implementation
+        if stats is not None:
+            stats.record_dispatch(perf_counter() - start, factory_calls)
+        return implementation
     
     def factory(self, *argtypes, level=0):
         """Return the factory function by searching in the dispatch list for
@@ -228,25 +453,145 @@ class Generic(_generic_base):
             except TypeError: # Found the None root type
                 raise no_methods_error(self, types=argtypes)
             
-    def which(self, *args):
+    def bind_site(self, size=4):
+        """Return a function that dispatches exactly as the generic function,
+        but keeps its own polymorphic inline cache with up to ``size`` entries
+        for each number of arguments.
+
+        A call site that sees only a few combinations of types can use it to
+        dispatch without touching the shared type cache::
+
+            add_site = add.bind_site()
+            for x, y in pairs:
+                total = add_site(x, y)
+
+        Registering new methods resets the caches of all bound sites."""
+
+        if size < 1:
+            raise ValueError('size must be positive, got %r' % size)
+        site = _make_caller(self, size)
+        self._sites.add(site)
+        return site
+
+    def starmap(self, iterable, ordered=True, counts=None):
+        """Call the generic function with each tuple of arguments in iterable
+        and return a list with the results.
+
+        Arguments are grouped by their types. Each signature is resolved only
+        once and the implementations are called in runs with all arguments of
+        the same signature. All signatures are resolved before calling any
+        implementation.
+
+        Parameters
+        ----------
+
+        iterable :
+            A sequence of tuples of positional arguments.
+        ordered : bool
+            If True (default), results have the same order as the inputs.
+            Otherwise, results are returned in groups of the same signature.
+        counts : dict
+            If given, it is updated with the number of calls for each tuple of
+            argument types.
+
+        Example
+        -------
+
+        >>> @generic
+        ... def double(x):
+        ...     return 2 * x
+        >>> counts = {}
+        >>> double.starmap([(1,), ('a',), (2,)], counts=counts)
+        [2, 'aa', 4]
+        >>> counts[int,], counts[str,]
+        (2, 1)
+        """
+
+        typeof = self._typeof or type
+        groups = {}
+        size = 0
+        for args in iterable:
+            types = tuple(map(typeof, args))
+            try:
+                indices, arglist = groups[types]
+            except KeyError:
+                indices, arglist = groups[types] = ([], [])
+            indices.append(size)
+            arglist.append(args)
+            size += 1
+
+        methods = [(self._lookup(types), group)
+                   for (types, group) in groups.items()]
+        if counts is not None:
+            for types, (indices, _) in groups.items():
+                counts[types] = counts.get(types, 0) + len(indices)
+
+        if ordered:
+            result = [None] * size
+            for func, (indices, arglist) in methods:
+                for i, args in zip(indices, arglist):
+                    result[i] = func(*args)
+        else:
+            result = []
+            for func, (_, arglist) in methods:
+                result.extend([func(*args) for args in arglist])
+        return result
+
+    def map(self, *iterables, ordered=True, counts=None):
+        """Call the generic function with arguments taken from each of the
+        iterables, as in the builtin map() function, and return a list with
+        the results.
+
+        Arguments are grouped by signature as in :meth:`starmap`.
+
+        >>> @generic
+        ... def add(x, y):
+        ...     return x + y
+        >>> add.map([1, 2.0, 'a'], [2, 3.0, 'b'])
+        [3, 5.0, 'ab']
+        """
+
+        return self.starmap(zip(*iterables), ordered=ordered, counts=counts)
+
+    def which(self, *args, **kwds):
         """Returns the concrete method that would be used if called with the
-        given positional arguments."""
+        given arguments."""
 
-        types = tuple(map(type, args))
+        typeof = self._typeof or type
+        if kwds and self._argnames is not None:
+            types = _keyword_types(self._argnames, args, kwds, typeof)
+        else:
+            types = tuple(map(typeof, args))
         try:
             return self[types]
         except KeyError:
-            raise TypeError('no methods for %s' % types)
+            raise no_methods_error(self, types=types)
     
     def register(self, *argtypes, **kwds):
         """Register a new implementation for the given sequence of input
         types.
+
+        If factory=True, func is a method factory: it is called as
+        ``func(argtypes, restype)`` with the concrete argument types of each
+        new signature and must return the implementation (or NotImplemented
+        to skip to the next method). Factories that return the same result
+        for whole families of types can declare a generality key with
+        ``key``. It is called with the same arguments and must return a
+        hashable value that determines the result of the factory. The factory
+        then runs only once for each different key and its result is shared
+        by all signatures with the same key::
+
+            @func.register(Number, Number, factory=True,
+                           key=lambda argtypes, restype: argtypes[0])
+            def factory(argtypes, restype):
+                ...  # result depends only on the first type
         """
         
         # Fetch keyword arguments (support Py2)
         func = kwds.pop('func', None)
         restype = kwds.pop('restype', None)
         is_factory = kwds.pop('factory', False)
+        key = kwds.pop('key', None)
         
         if kwds:
             arg = kwds.popitem()[0]
@@ -255,18 +600,27 @@ class Generic(_generic_base):
         # We don't use the restype for now. Maybe in the future? Ideas?
         if func is None:
             def decorator(func):
-                self.register(*argtypes, 
-                              func=func, factory=is_factory, restype=restype)
+                self.register(*argtypes, func=func, factory=is_factory,
+                              restype=restype, key=key)
                 return self.__self_or_func(func)
             return decorator
 
         # Register directly as factory
+        if key is not None and not is_factory:
+            raise TypeError('key requires factory=True')
         if is_factory:
+            if key is not None:
+                func = _MemoizedFactory(func, key)
             return self._register_factory(argtypes, 
                               factory=func, restype=restype)
         
         # Register factory in the internal dictionary
-        wrapped = functools.partial(_simple_factory, func) 
+        method = func
+        if self._typecheck is not None and argtypes:
+            method = checked(func, argtypes, restype,
+                             strict=self._typecheck == 'strict',
+                             argnames=self._argnames)
+        wrapped = functools.partial(_simple_factory, method)
         self._register_factory(argtypes, factory=wrapped, restype=restype)
         
         # Update documentation, if empty
@@ -291,27 +645,89 @@ class Generic(_generic_base):
             tname = type(restype).__name__
             raise ValueError('return type must be a type, got %s' % tname)
 
-        # Prevent overwriting old values
-        if argtypes in self._registry:
-            types_repr = ', '.join(T.__name__ for T in argtypes)
-            name = self.name
-            msg = 'method %s(%s) is already defined' % (name, types_repr)
-            raise TypeError(msg)
-
-        # Add keys and update cache
         if self._validate is not None:
             self._validate(argtypes, restype)
-        
-        self._registry[argtypes] = (factory, restype)
-        #subkeys = subtypes(argtypes, self._registry)
-        #for k in list(self._cache):
-        #    if subtypecheck(k, argtypes):
-        #        if not any(subtypecheck(k, K) for K in subkeys):
-        #           del self._cache[k]
+
+        with self._lock:
+            if self._frozen:
+                raise RuntimeError('cannot register methods in frozen generic '
+                                   'function %s()' % self.name)
+
+            # Prevent overwriting old values
+            if argtypes in self._registry:
+                types_repr = ', '.join(T.__name__ for T in argtypes)
+                name = self.name
+                msg = 'method %s(%s) is already defined' % (name, types_repr)
+                raise TypeError(msg)
+
+            # Add keys and update cache
+            self._registry[argtypes] = (factory, restype)
+            self._tree.add(argtypes)
+            self._epoch += 1
+            self._invalidations[argtypes] = self._invalidate(argtypes)
+            self._reset_inline_caches()
+
+    def _invalidate(self, argtypes):
+        """Remove all cache entries that the new signature argtypes may
+        shadow and return the number of evicted entries.
+
+        An entry is kept if it is not a subtype of argtypes or if it is a
+        subtype of some registered signature that is more specific than
+        argtypes, since that signature has precedence. Only signatures of
+        simple methods are considered: factories may return NotImplemented
+        and leave the entry to a less specific method."""
+
         registry = self._registry
-        keep_cache = {T: f for (T, f) in self._cache if T in registry}
-        self._cache.clear()
-        self._cache.update(keep_cache)
+        subkeys = [S for S in subtypes(argtypes, registry)
+                   if S != argtypes and _is_simple_factory(registry[S][0])]
+        cache = self._cache
+        evicted = []
+
+        # The subtypecheck memo holds strong references and must not keep the
+        # types of a weak cache alive
+        memo = not self._weak
+        for key in cache:
+            if subtypecheck(key, argtypes, memo):
+                if not any(subtypecheck(key, S, memo) for S in subkeys):
+                    evicted.append(key)
+        for key in evicted:
+            # Bounded caches count pop() as a hit
+            try:
+                del cache[key]
+            except KeyError:
+                pass
+        return len(evicted)
+
+    def _reset_inline_caches(self):
+        """Reset the last call cache and the caches of all bound call sites.
+
+        Inline caches may hold methods that are no longer in the type cache
+        (e.g., evicted from a bounded cache), so they are always reset when
+        the registry changes."""
+
+        self._cache_update()
+        for site in list(self._sites):
+            site.clear()
+
+    def _cache_update(self):
+        """Reset the last call cache."""
+
+        self._call = _make_caller(self)
+
+    def _lookup(self, types):
+        """Return the implementation for the given tuple of types from the
+        cache or from the dispatch algorithm."""
+
+        stats = self._stats
+        try:
+            func = self._cache[types]
+        except KeyError:
+            if stats is not None:
+                stats.misses += 1
+            return self.dispatch(*types)
+        if stats is not None:
+            stats.cache_hits += 1
+        return func
 
     def overload(self, *args, **kwds):
         """Decorator used to register method overloads"""
@@ -375,24 +791,115 @@ class Generic(_generic_base):
     
 
 #
-# Uses the fast version of the __call__ method if available from C class
+# Uses the fast version of the __call__ method if available from C class. The
+# pure Python versions are kept so they can be compared with the C versions.
 #
+_pure_python_methods = {name: Generic.__dict__[name]
+                        for name in ['__call__', '_cache_update']}
 try:
     if 'FastCache' in [cls.__name__ for cls in Generic.mro()]:
         del Generic.__call__
+        del Generic._cache_update
 except AttributeError:
     pass
 
 
+def _make_caller(self, size=1):
+    """Return a function that dispatches to the implementations of the given
+    generic function. It implements the pure Python version of __call__ and
+    the call sites returned by Generic.bind_site().
+
+    Calls with 1, 2 or 3 positional arguments have their own inline cache
+    with up to ``size`` entries. Each entry is a tuple with the argument types
+    and the resolved implementation, so a hit costs one identity check per
+    argument and does not create any intermediate tuple. Entries are replaced
+    as a whole, hence concurrent calls always see consistent types and
+    implementations, and no lock is required.
+
+    The returned function has a clear() attribute that empties the caches."""
+
+    entries1 = entries2 = entries3 = entriesn = ()
+    lookup = self._lookup
+    typeof = self._typeof or type
+    stats = self._stats
+    keep = size - 1
+
+    def call(*args, **kwds):
+        nonlocal entries1, entries2, entries3, entriesn
+
+        if kwds and self._argnames is not None:
+            types = _keyword_types(self._argnames, args, kwds, typeof)
+            return lookup(types)(*args, **kwds)
+
+        n = len(args)
+        if n == 2:
+            x, y = args
+            X, Y = typeof(x), typeof(y)
+            for A, B, func in entries2:
+                if X is A and Y is B:
+                    if stats is not None:
+                        stats.slot_hits += 1
+                    return func(*args, **kwds)
+            epoch = self._epoch
+            func = lookup((X, Y))
+            entries2 = ((X, Y, func),) + entries2[:keep]
+        elif n == 1:
+            X = typeof(args[0])
+            for A, func in entries1:
+                if X is A:
+                    if stats is not None:
+                        stats.slot_hits += 1
+                    return func(*args, **kwds)
+            epoch = self._epoch
+            func = lookup((X,))
+            entries1 = ((X, func),) + entries1[:keep]
+        elif n == 3:
+            x, y, z = args
+            X, Y, Z = typeof(x), typeof(y), typeof(z)
+            for A, B, C, func in entries3:
+                if X is A and Y is B and Z is C:
+                    if stats is not None:
+                        stats.slot_hits += 1
+                    return func(*args, **kwds)
+            epoch = self._epoch
+            func = lookup((X, Y, Z))
+            entries3 = ((X, Y, Z, func),) + entries3[:keep]
+        else:
+            types = tuple(map(typeof, args))
+            for key, func in entriesn:
+                if key == types:
+                    if stats is not None:
+                        stats.slot_hits += 1
+                    return func(*args, **kwds)
+            epoch = self._epoch
+            func = lookup(types)
+            entriesn = ((types, func),) + entriesn[:keep]
+
+        # The new entry may be stale if some method was registered during
+        # the lookup. Registrations update the epoch before clearing the
+        # inline caches, so we drop the entries if the epoch has changed.
+        if epoch != self._epoch:
+            clear()
+        return func(*args, **kwds)
+
+    def clear():
+        nonlocal entries1, entries2, entries3, entriesn
+        entries1 = entries2 = entries3 = entriesn = ()
+
+    call.clear = clear
+    return call
+
+
 #
 # Utility functions
 #
-def subtypecheck(types1, types2):
+def subtypecheck(types1, types2, memo=True):
     """Return True if all types in the sequence types1 are subclasses of the
     respective types in the sequence types2.
 
     The special value of None is considered to be the root type of all type
-    sequences.
+    sequences. Results for tuples are memoized (see
+    :mod:`generic.abccache`) unless memo=False.
 
     Example
     -------
@@ -412,6 +919,8 @@ def subtypecheck(types1, types2):
 
     if len(types1) != len(types2):
         return False
+    elif memo and type(types1) is tuple and type(types2) is tuple:
+        return memo_subtypecheck(types1, types2)
     else:
         return all(issubclass(T1, T2) for (T1, T2) in zip(types1, types2))
 
@@ -424,7 +933,17 @@ def dispatch(T, options, fname='function'):
     
     subclass = subtypecheck
     parents = [S for S in options if subclass(T, S)]
-    
+    return _most_specific(T, parents, fname)
+
+
+def _most_specific(T, parents, fname='function'):
+    """Return the most specialized signature in the list of parents, i.e., the
+    signatures S that accept T.
+
+    Raises a DispatchError if the choice is ambiguous and a KeyError if parents
+    is empty."""
+
+    subclass = subtypecheck
     for _ in range(len(parents)):
         if len(parents) == 1:
             break
@@ -460,13 +979,91 @@ def supertypes(T, D):
     return [S for S in D if subclass(T, S)]
 
 
+def all_generics():
+    """Return a list with all generic functions alive in the process."""
+
+    return list(_generics.values())
+
+
+def freeze_all():
+    """Freeze all generic functions (see :meth:`Generic.freeze`).
+
+    Applications can call it after importing all their modules, when no new
+    methods should be registered."""
+
+    for func in all_generics():
+        func.freeze()
+
+
+def clear_caches():
+    """Clear the caches of all generic functions (see
+    :meth:`Generic.clear_cache`)."""
+
+    for func in all_generics():
+        func.clear_cache()
+
+
+def cache_memory_report():
+    """Return a list of dictionaries describing the type cache of each
+    generic function, sorted by decreasing memory usage.
+
+    Each dictionary has the following keys:
+
+    name:
+        Name of the generic function.
+    methods:
+        Number of registered methods.
+    entries:
+        Number of entries in the type cache.
+    nbytes:
+        Estimate of the memory used by the type cache, in bytes. It does not
+        count the types and implementations, which are shared with the rest
+        of the program.
+    frozen:
+        True for frozen generic functions.
+    """
+
+    report = []
+    for func in all_generics():
+        cache = func._cache
+        report.append({
+            'name': func.name,
+            'methods': len(func),
+            'entries': len(cache),
+            'nbytes': cache_nbytes(cache),
+            'frozen': func.frozen,
+        })
+    report.sort(key=lambda x: x['nbytes'], reverse=True)
+    return report
+
+
 def generic(*args, **kwds):
-    """Decorator used to define a generic function"""
+    """Decorator used to define a generic function.
+
+    The optional ``maxsize``, ``policy``, ``weak`` and ``compact`` keyword
+    arguments configure the type cache as in the Generic constructor::
+
+        @generic(maxsize=256, policy='lfu')
+        def func(x, y):
+            ...
+
+    Use ``keywords=True`` to dispatch on keyword arguments using the argument
+    names of the decorated function. The ``typeof`` keyword argument sets the
+    function that computes the dispatch key of each argument and
+    ``typecheck`` enables the type checking wrappers.
+    """
 
     if args and callable(args[0]):
         func = args[0]
         args = args[1:]
-        result = Generic(func.__name__)
+        options = {}
+        for opt in ['maxsize', 'policy', 'weak', 'compact', 'typeof',
+                    'typecheck']:
+            if opt in kwds:
+                options[opt] = kwds.pop(opt)
+        if kwds.pop('keywords', False):
+            options['argnames'] = inspect_argnames(func)
+        result = Generic(func.__name__, **options)
         if args or kwds:
             result.overload(*args, **kwds)(func)
         else:
@@ -519,6 +1116,26 @@ def inspect_signature(func):
         return tuple(object for name in varnames), object
 
 
+def inspect_argnames(func):
+    """Return a tuple with the names of the positional arguments of func"""
+
+    code = func.__code__
+    return code.co_varnames[:code.co_argcount]
+
+
+def _keyword_types(argnames, args, kwds, typeof=type):
+    """Return the types of the positional arguments followed by the types of
+    the keyword arguments that fill the next positions in argnames"""
+
+    types = list(map(typeof, args))
+    for name in argnames[len(args):]:
+        try:
+            types.append(typeof(kwds[name]))
+        except KeyError:
+            break
+    return tuple(types)
+
+
 def is_fallback_signature(func):
     """Inspect function arguments and return True if it should be
     considered a fallback implementation."""
@@ -600,28 +1217,81 @@ class mappingproxy(Mapping):
 #
 # Standard meta-factory functions
 #
+class _MemoizedFactory(object):
+
+    """Wraps a method factory and memoizes its results by a generality key.
+
+    ``key(argtypes, restype)`` must return a hashable value that determines
+    the result of ``factory(argtypes, restype)``. Results are stored per key,
+    including NotImplemented, so the factory runs once for each key. The memo
+    is emptied when it reaches maxsize entries.
+
+    >>> calls = []
+    >>> def factory(argtypes, restype):
+    ...     calls.append(argtypes)
+    ...     return lambda x, y: None
+    >>> memo = _MemoizedFactory(factory, lambda argtypes, restype: None)
+    >>> memo((int, int), None) is memo((float, str), None)
+    True
+    >>> calls
+    [(<class 'int'>, <class 'int'>)]
+    """
+
+    __slots__ = ('factory', 'key', 'maxsize', '_memo')
+
+    def __init__(self, factory, key, maxsize=1024):
+        self.factory = factory
+        self.key = key
+        self.maxsize = maxsize
+        self._memo = {}
+
+    def __call__(self, argtypes, restype):
+        key = self.key(argtypes, restype)
+        memo = self._memo
+        try:
+            return memo[key]
+        except KeyError:
+            pass
+
+        # Concurrent misses may run the factory twice for the same key. This
+        # is harmless, since both results are equivalent.
+        result = self.factory(argtypes, restype)
+        if len(memo) >= self.maxsize:
+            memo.clear()
+        memo[key] = result
+        return result
+
+    def __repr__(self):
+        return '_MemoizedFactory(%r, key=%r)' % (self.factory, self.key)
+
+    def clear(self):
+        """Forget all memoized results."""
+
+        self._memo.clear()
+
+
 def _simple_factory(func, argtypes, restype):
     """The most simple builder: return the function unchanged"""
     
     return func
 
 
+def _is_simple_factory(factory):
+    """Return True if factory was created from a simple method by
+    register() and thus never returns NotImplemented."""
+
+    return (isinstance(factory, functools.partial) and
+            factory.func is _simple_factory)
+
+
 def _restype_checker_factory(func, argtypes, restype):
     """Check if the return type is correct"""
 
     if restype is None:
         return func
-        
-    @functools.wraps
-    def checked(*args, **kwds):
-        out = func(*args, **kwds)
-        if not isinstance(out, restype):
-            raise TypeError('wrong return type: %s' % tname(out))
-        return out
-                 
-    return checked
+    return checked(func, (object,) * len(argtypes), restype)
+
 
-    
 def _strict_check_factory(func, argtypes, restype):
     """
     Check if all input/output types are *exactly* the same as declared.
@@ -629,35 +1299,14 @@ def _strict_check_factory(func, argtypes, restype):
     Raise type errors with subclasses.
     """
     
-    return _instance_check_factory(func, argtypes, restype, 
-                                   instancecheck=lambda x, y: x is y) 
+    return checked(func, argtypes, restype, strict=True)
 
 
-def _instance_check_factory(func, argtypes, restype, instancecheck=isinstance):
+def _instance_check_factory(func, argtypes, restype):
     """
     Check if all input/output types are the same as declared.
     
     Subclasses are also allowed.
     """
     
-    N = len(argtypes)
-    
-    @functools.wraps
-    def checked(*args, **kwds):
-        if len(args) == N:
-            raise TypeError('wrong number of arguments')
-        for i, (x, T) in enumerate(zip(x, T)):
-            if instancecheck(x, T):
-                fmt = i, tname(x), T.__name__
-                msg = 'error: %-th argument should be %s, got %s' % fmt
-                raise TypeError(msg)
-        
-        if restype is None:
-            return func(*args, **kwds)
-        else:
-            out = func(*args, **kwds)
-            if not instancecheck(out, restype):
-                raise TypeError('wrong return type: %s' % tname(out))
-            return out
-                 
-    return checked
+    return checked(func, argtypes, restype)
@@ -1,83 +1,240 @@
 import cython
 from cpython cimport PyObject, PyTuple_GET_SIZE, PyObject_Call
 from cpython cimport Py_INCREF, Py_XINCREF, Py_DECREF, Py_XDECREF, Py_CLEAR
+from cpython.tuple cimport PyTuple_New, PyTuple_SET_ITEM
 
 cdef extern from "Python.h":
     int PyDict_Size(PyObject*)
-    PyObject* PyTuple_New(int)
     PyObject* PyTuple_GET_ITEM(PyObject*, int)
-    void PyTuple_SET_ITEM(PyObject*, int, PyObject*)
+    PyObject* PyList_GET_ITEM(PyObject*, Py_ssize_t)
     PyObject* PyDict_GetItem(PyObject* , PyObject*)
 
+cdef extern from "pythread.h":
+    unsigned long PyThread_get_thread_ident()
+
+# Number of last call slots. Must be a power of two.
+DEF SLOTS_BITS = 4
+DEF NSLOTS = 1 << SLOTS_BITS
+
+
 cdef class FastCache(object):
 
     '''Implements a multi argument dispatch function.'''
 
-    cdef int __last_arglen
-    cdef void* __last_argtypes[5]
-    cdef object __last_function
-    cdef dict __cache
+    # The last call cache. Each thread uses the slot selected by a hash of
+    # its identifier, so threads that see different types do not thrash a
+    # single shared slot. Slots hold (types, function) tuples that are
+    # replaced as a whole. Threads that share a slot are still correct,
+    # since a hit only depends on the types stored with the function.
+    cdef list __last_slots
+    cdef object __cache
+    cdef bint __cache_is_dict
+    cdef tuple __argnames
+    cdef object __typeof
+
+    # DispatchStats object of instrumented generic functions or None
+    cdef object __stats
+
+    # Incremented when registrations invalidate the caches
+    cdef public Py_ssize_t _epoch
 
     def __init__(self):
         self.__cache = {}
+        self.__cache_is_dict = True
+        self.__argnames = None
+        self.__typeof = None
+        self.__stats = None
         self._cache_update()
 
     @cython.nonecheck(False)
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
     def __call__(self, *args, **kwargs):
         "Resolve and dispatch to best method."
 
-        cdef int N = PyTuple_GET_SIZE(args)
-        cdef PyObject* types = NULL
-        cdef PyObject* item
-        cdef int i, is_dirty = 1
-
-        # Check if args repeats the last call types
-        if self.__last_arglen == N:
-            is_dirty = 0
-            for i in range(N):
-                T = <void*> PyTuple_GET_ITEM(<PyObject*> args, i).ob_type
-                if T != self.__last_argtypes[i]:
-                    is_dirty = 1
-                    break
+        cdef Py_ssize_t i, N = PyTuple_GET_SIZE(args)
+        cdef Py_ssize_t k = thread_slot()
+        cdef PyObject* entry
+        cdef PyObject* last
+        cdef tuple types
+        cdef list slots
+        cdef void* T
+        cdef Py_ssize_t epoch
+
+        # Keyword arguments take part in dispatch
+        if kwargs and self.__argnames is not None:
+            types = keyword_types(self.__argnames, args, kwargs, self.__typeof)
+
+        # Dispatch keys computed by a custom function
+        elif self.__typeof is not None:
+            types = keytypes(self.__typeof, args, N)
+
+            # typeof may run Python code that switches threads, so we must
+            # read the slot only after computing the keys
+            entry = PyList_GET_ITEM(<PyObject*> self.__last_slots, k)
+            if entry != <PyObject*> None:
+                last = PyTuple_GET_ITEM(entry, 0)
+                if PyTuple_GET_SIZE(<object> last) == N:
+                    for i in range(N):
+                        T = <void*> PyTuple_GET_ITEM(<PyObject*> types, i)
+                        if T != <void*> PyTuple_GET_ITEM(last, i):
+                            break
+                    else:
+                        if self.__stats is not None:
+                            self.__stats.slot_hits += 1
+                        func = <object> PyTuple_GET_ITEM(entry, 1)
+                        return PyObject_Call(func, args, kwargs)
+
+        else:
+            # Check if args repeats the last call types of this thread
+            entry = PyList_GET_ITEM(<PyObject*> self.__last_slots, k)
+            if entry != <PyObject*> None:
+                last = PyTuple_GET_ITEM(entry, 0)
+                if PyTuple_GET_SIZE(<object> last) == N:
+                    for i in range(N):
+                        T = <void*> PyTuple_GET_ITEM(<PyObject*> args, i).ob_type
+                        if T != <void*> PyTuple_GET_ITEM(last, i):
+                            break
+                    else:
+                        if self.__stats is not None:
+                            self.__stats.slot_hits += 1
+                        func = <object> PyTuple_GET_ITEM(entry, 1)
+                        return PyObject_Call(func, args, kwargs)
+            types = argtypes(args, N)
 
         # Not in the last call cache, try the dictionary cache instead
-        if is_dirty == 1:
-            # Create type tuple
-            types = PyTuple_New(N)
-            for i in range(N):
-                item = PyTuple_GET_ITEM(<PyObject*> args, i)
-                item = <PyObject*> (item.ob_type)
-                Py_XINCREF(item)
-                PyTuple_SET_ITEM(types, i, item)
-
-            # Get value from cache dictionary
-            item = PyDict_GetItem(<PyObject*> self.__cache, types)
-            if item == NULL:
-                self.__last_function = self.dispatch(*(<object> types))
-            else:
-                self.__last_function = <object> item
-
-            # Save cache for next execution
-            for i in range(N):
-                self.__last_argtypes[i] = <void*> PyTuple_GET_ITEM(types, i)
-            self.__last_arglen = N
-            Py_CLEAR(types)
+        epoch = self._epoch
+        func = self._lookup(types)
+
+        # Releasing the old entry may run arbitrary code (e.g., weakref
+        # callbacks), so we hold a reference to it until the new entry is
+        # stored. The slots list may have been replaced during the lookup.
+        slots = self.__last_slots
+        old = slots[k]
+        slots[k] = (types, func)
+        old = None
+
+        # A method registered during the lookup may have reset the slots
+        # before we stored a stale function in them
+        if epoch != self._epoch:
+            slots[k] = None
 
         # Execute the imlementation function with proper arguments
-        return PyObject_Call(self.__last_function, args, kwargs)
+        return PyObject_Call(func, args, kwargs)
+
+    cdef object _lookup(self, tuple types):
+        cdef PyObject* item
+
+        # Get value from cache dictionary. Bounded caches are not dicts
+        # and must be accessed through their mapping interface
+        if self.__cache_is_dict:
+            item = PyDict_GetItem(<PyObject*> self.__cache, <PyObject*> types)
+            if item != NULL:
+                if self.__stats is not None:
+                    self.__stats.cache_hits += 1
+                return <object> item
+        else:
+            try:
+                func = self.__cache[types]
+            except KeyError:
+                pass
+            else:
+                if self.__stats is not None:
+                    self.__stats.cache_hits += 1
+                return func
+        if self.__stats is not None:
+            self.__stats.misses += 1
+        return self.dispatch(*types)
 
     property _cache:
         def __get__(self):
             return self.__cache
 
         def __set__(self, value):
-            self.__cache.update(value)
+            self.__cache = value
+            self.__cache_is_dict = type(value) is dict
+            self._cache_update()
+
+    property _argnames:
+        def __get__(self):
+            return self.__argnames
+
+        def __set__(self, value):
+            self.__argnames = None if value is None else tuple(value)
+            self._cache_update()
+
+    property _stats:
+        def __get__(self):
+            return self.__stats
+
+        def __set__(self, value):
+            self.__stats = value
+            self._cache_update()
+
+    property _typeof:
+        def __get__(self):
+            return self.__typeof
+
+        def __set__(self, value):
+            self.__typeof = value
+            self._cache_update()
 
     cpdef _cache_update(self):
-        self.__last_arglen = -1
+        self.__last_slots = [None] * NSLOTS
+
+
+cdef inline Py_ssize_t thread_slot():
+    "Return the index of the last call slot of the current thread"
+
+    # Thread identifiers are often aligned addresses, so we use a Fibonacci
+    # hash to take the relevant bits
+    cdef unsigned long long ident = PyThread_get_thread_ident()
+    return <Py_ssize_t> ((ident * 11400714819323198485ULL) >> (64 - SLOTS_BITS))
+
+
+def _thread_slot():
+    "Return the index of the last call slot of the current thread"
+
+    return thread_slot()
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef inline tuple argtypes(tuple args, Py_ssize_t N):
+    "Return a tuple with the types of all arguments"
+
+    cdef tuple types = PyTuple_New(N)
+    cdef Py_ssize_t i
+    for i in range(N):
+        T = type(args[i])
+        Py_INCREF(T)
+        PyTuple_SET_ITEM(types, i, T)
+    return types
+
+
+cdef tuple keytypes(object typeof, tuple args, Py_ssize_t N):
+    "Return a tuple with the dispatch keys of all arguments"
 
-cdef inline int tuples_eq(tuple t1, tuple t2, int N):
+    cdef tuple types = PyTuple_New(N)
+    cdef Py_ssize_t i
     for i in range(N):
-        if t1[i] is not t2[i]:
-            return False
-    return True
+        T = typeof(args[i])
+        Py_INCREF(T)
+        PyTuple_SET_ITEM(types, i, T)
+    return types
+
+
+cdef tuple keyword_types(tuple argnames, tuple args, dict kwargs,
+                         object typeof):
+    """Return the types of positional arguments followed by the types of the
+    keyword arguments that fill the next positions in argnames."""
+
+    if typeof is None:
+        typeof = type
+    cdef list types = [typeof(x) for x in args]
+    for name in argnames[len(args):]:
+        try:
+            types.append(typeof(kwargs[name]))
+        except KeyError:
+            break
+    return tuple(types)
@@ -0,0 +1,201 @@
+"""
+An index of type signatures used to speed up the dispatch algorithm.
+
+The brute force dispatch() function in generic.core tests every registered
+signature with issubclass() for each argument. The DispatchTree implemented
+here groups signatures by arity and, for each argument position, maps the
+declared types to the signatures that use them. Finding the signatures that
+accept a given tuple of types then costs a walk over the MRO of each argument
+instead of a scan over the whole registry.
+"""
+
+import weakref
+from .abccache import issubtype
+
+__all__ = ['DispatchTree']
+
+# Memos of argument types are emptied when they reach this size
+MEMO_MAXSIZE = 1024
+
+
+class DispatchTree(object):
+
+    """Index of signatures that computes which signatures accept a given
+    tuple of argument types.
+
+    The special signature None represents the root fallback and accepts every
+    tuple of types. If weak=True, the tree holds only weak references to the
+    argument types it memoizes. Otherwise, at most memo_size argument types
+    are memoized for each argument position.
+
+    Example
+    -------
+
+    >>> tree = DispatchTree([(object, object), (int, int), (int, float)])
+    >>> tree.candidates((bool, int)) == {(object, object), (int, int)}
+    True
+
+    Signatures can be added incrementally
+
+    >>> tree.add((bool, object))
+    >>> tree.candidates((bool, int)) == {(object, object), (int, int),
+    ...                                  (bool, object)}
+    True
+    """
+
+    __slots__ = ('_arities', '_has_root', '_weak', '_memo_size')
+
+    def __init__(self, signatures=(), weak=False, memo_size=MEMO_MAXSIZE):
+        self._arities = {}
+        self._has_root = False
+        self._weak = weak
+        self._memo_size = memo_size
+        for signature in signatures:
+            self.add(signature)
+
+    def __len__(self):
+        size = sum(len(node.signatures) for node in self._arities.values())
+        return size + self._has_root
+
+    def __contains__(self, signature):
+        if signature is None:
+            return self._has_root
+        try:
+            return signature in self._arities[len(signature)].signatures
+        except KeyError:
+            return False
+
+    def add(self, signature):
+        """Add a new signature to the index.
+
+        Only the entries affected by the new signature are updated."""
+
+        if signature is None:
+            self._has_root = True
+            return
+
+        signature = tuple(signature)
+        try:
+            node = self._arities[len(signature)]
+        except KeyError:
+            node = _ArityNode(len(signature), self._weak, self._memo_size)
+            self._arities[len(signature)] = node
+        node.add(signature)
+
+    def candidates(self, argtypes):
+        """Return a set with all signatures S that accept the given argument
+        types, i.e., subtypecheck(argtypes, S) is True."""
+
+        try:
+            node = self._arities[len(argtypes)]
+        except KeyError:
+            result = set()
+        else:
+            result = node.candidates(argtypes)
+
+        if self._has_root:
+            result.add(None)
+        return result
+
+    def clear_memo(self):
+        """Forget all memoized argument types."""
+
+        for node in list(self._arities.values()):
+            for position in node.positions:
+                position.memo.clear()
+
+
+class _ArityNode(object):
+
+    """Holds all signatures of a given arity"""
+
+    __slots__ = ('signatures', 'positions')
+
+    def __init__(self, arity, weak=False, memo_size=MEMO_MAXSIZE):
+        self.signatures = set()
+        self.positions = [_Position(weak, memo_size) for _ in range(arity)]
+
+    def add(self, signature):
+        if signature in self.signatures:
+            return
+        self.signatures.add(signature)
+        for position, T in zip(self.positions, signature):
+            position.add(T, signature)
+
+    def candidates(self, argtypes):
+        if not self.positions:
+            return set(self.signatures)
+
+        matches = [pos.matches(T)
+                   for (pos, T) in zip(self.positions, argtypes)]
+        matches.sort(key=len)
+        result = set(matches[0])
+        for other in matches[1:]:
+            if not result:
+                break
+            result.intersection_update(other)
+        return result
+
+
+class _Position(object):
+
+    """Index of the types declared in a single argument position.
+
+    Types whose subclass relation is decided by the MRO are stored in the
+    nominal index and are found by walking the MRO of the argument type. The
+    results of these walks are memoized. Other types (e.g., ABCs) may change
+    their subclass relations at runtime, so they are kept in a separate table
+    and are always checked with issubtype(). Weak positions use issubclass()
+    instead, since issubtype() keeps strong references to the checked types.
+    The memo of other positions is emptied when it reaches memo_size types.
+    """
+
+    __slots__ = ('nominal', 'virtual', 'memo', 'memo_size', 'subclass')
+
+    def __init__(self, weak=False, memo_size=MEMO_MAXSIZE):
+        self.nominal = {}
+        self.virtual = {}
+        self.memo = weakref.WeakKeyDictionary() if weak else {}
+        self.memo_size = None if weak else memo_size
+        self.subclass = issubclass if weak else issubtype
+
+    def add(self, T, signature):
+        if _is_nominal(T):
+            self.nominal.setdefault(T, set()).add(signature)
+
+            # Update only the memoized types that are affected by T
+            memo = self.memo
+            for argtype, signatures in list(memo.items()):
+                if T in argtype.__mro__:
+                    memo[argtype] = signatures.union([signature])
+        else:
+            self.virtual.setdefault(T, set()).add(signature)
+
+    def matches(self, T):
+        """Return a set with all signatures that accept T in this position"""
+
+        try:
+            result = self.memo[T]
+        except KeyError:
+            nominal = self.nominal
+            result = frozenset().union(
+                *[nominal[B] for B in T.__mro__ if B in nominal])
+            memo = self.memo
+            if self.memo_size is not None and len(memo) >= self.memo_size:
+                memo.clear()
+            memo[T] = result
+
+        if self.virtual:
+            subclass = self.subclass
+            extra = [signatures for (B, signatures) in self.virtual.items()
+                     if subclass(T, B)]
+            if extra:
+                result = result.union(*extra)
+        return result
+
+
+def _is_nominal(T):
+    """Return True if issubclass(X, T) is equivalent to checking if T is in
+    X.__mro__"""
+
+    return type(T).__subclasscheck__ is type.__subclasscheck__
@@ -5,7 +5,12 @@ Holds all special error classes defined for the generic module.
 
 class InexactError(ValueError):
     """Raised on conversion of float values with decimal places to integer
-    types"""
+    types.
+
+    Errors raised by convert_many() store the position of the offending value
+    in the ``index`` attribute (a tuple for multidimensional arrays)."""
+
+    index = None
 
 
 class DispatchError(TypeError):
@@ -0,0 +1,109 @@
+"""
+Statistics collected by instrumented generic functions.
+
+Instrumentation is disabled by default. Call Generic.instrument() to start
+collecting statistics for a generic function::
+
+    stats = add.instrument()
+    ...  # run some workload
+    print(stats.as_dict())
+
+Generic functions with many cache misses or slow dispatches are good
+candidates for warming up (see :mod:`generic.profiles`) or freezing (see
+Generic.freeze()).
+
+Counters are updated without locks, so the numbers are approximate when the
+generic function is called concurrently by many threads.
+"""
+
+__all__ = ['DispatchStats']
+
+# Dispatch times are recorded in buckets of powers of two microseconds
+NBUCKETS = 24
+
+
+class DispatchStats(object):
+
+    """Counters of an instrumented generic function.
+
+    Attributes
+    ----------
+
+    slot_hits :
+        Calls resolved by the last call cache or by the inline caches.
+    cache_hits :
+        Lookups resolved by the type cache.
+    misses :
+        Lookups that were not found in the type cache and required a call
+        to dispatch().
+    dispatches :
+        Number of executions of the dispatch algorithm, including those
+        started explicitly (e.g., by warmup()).
+    factory_calls :
+        Number of method factories called by the dispatch algorithm.
+    dispatch_time :
+        Total time spent in dispatch(), in seconds.
+    histogram :
+        List of counts of dispatch times. The k-th bucket counts executions
+        that took less than 2**k microseconds (and at least 2**(k - 1)
+        microseconds). The last bucket also counts all slower executions.
+    """
+
+    __slots__ = ('slot_hits', 'cache_hits', 'misses', 'dispatches',
+                 'factory_calls', 'dispatch_time', 'histogram')
+
+    def __init__(self):
+        self.reset()
+
+    def __repr__(self):
+        return ('<DispatchStats: %s calls, %s slot hits, %s cache hits, '
+                '%s misses>' % (self.calls, self.slot_hits, self.cache_hits,
+                                self.misses))
+
+    @property
+    def calls(self):
+        """Total number of calls and lookups"""
+
+        return self.slot_hits + self.cache_hits + self.misses
+
+    def reset(self):
+        """Set all counters to zero."""
+
+        self.slot_hits = self.cache_hits = self.misses = 0
+        self.dispatches = self.factory_calls = 0
+        self.dispatch_time = 0.0
+        self.histogram = [0] * NBUCKETS
+
+    def record_dispatch(self, elapsed, factory_calls):
+        """Record an execution of the dispatch algorithm that took elapsed
+        seconds and called the given number of factories."""
+
+        self.dispatches += 1
+        self.factory_calls += factory_calls
+        self.dispatch_time += elapsed
+        bucket = int(elapsed * 1e6).bit_length()
+        self.histogram[min(bucket, NBUCKETS - 1)] += 1
+
+    def as_dict(self):
+        """Return a dictionary with all statistics.
+
+        The histogram is exported as a list of [upper bound in microseconds,
+        count] pairs for the non-empty buckets.
+
+        >>> stats = DispatchStats()
+        >>> stats.record_dispatch(3e-6, 1)
+        >>> stats.as_dict()['dispatch_histogram']
+        [[4, 1]]
+        """
+
+        histogram = [[2 ** k, n] for (k, n) in enumerate(self.histogram) if n]
+        return {
+            'calls': self.calls,
+            'slot_hits': self.slot_hits,
+            'cache_hits': self.cache_hits,
+            'misses': self.misses,
+            'dispatches': self.dispatches,
+            'factory_calls': self.factory_calls,
+            'dispatch_time': self.dispatch_time,
+            'dispatch_histogram': histogram,
+        }
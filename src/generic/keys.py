@@ -0,0 +1,83 @@
+"""
+Functions that compute dispatch keys for the typeof argument of generic
+functions.
+
+By default, generic functions dispatch on the type of each argument. All NumPy
+arrays share the same type, hence a method registered for ndarray must handle
+every possible dtype. The dtype_key() function maps each array to a subclass
+of ndarray that represents its dtype. These subclasses follow the hierarchy of
+NumPy scalar types, so methods can be registered either for concrete dtypes or
+for abstract families of dtypes:
+
+>>> import numpy as np
+>>> from generic import generic
+>>> @generic(typeof=dtype_key)
+... def kind(x):
+...     return 'other'
+>>> @kind.register(array_type(np.floating))
+... def kind(x):
+...     return 'float array'
+>>> @kind.register(array_type(np.integer))
+... def kind(x):
+...     return 'integer array'
+>>> kind(np.zeros(3)), kind(np.arange(3)), kind(np.array(['a']))
+('float array', 'integer array', 'other')
+
+Implementations still receive the original arrays. The array types are used
+only as dispatch keys.
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__all__ = ['array_type', 'dtype_key']
+
+_array_types = {}
+
+
+def array_type(scalar):
+    """Return the subclass of ndarray that represents arrays whose dtype has
+    the given scalar type (e.g., numpy.float64 or numpy.floating).
+
+    Array types are cached, hence the same class is returned for the same
+    scalar type."""
+
+    try:
+        return _array_types[scalar]
+    except (KeyError, TypeError):
+        pass
+
+    if numpy is None:
+        raise RuntimeError('array types require NumPy')
+    if isinstance(scalar, numpy.dtype):
+        return array_type(scalar.type)
+    if not (isinstance(scalar, type) and issubclass(scalar, numpy.generic)):
+        raise TypeError('expect a NumPy scalar type, got %r' % scalar)
+
+    if scalar is numpy.generic:
+        bases = (numpy.ndarray,)
+    else:
+        bases = tuple(array_type(B) for B in scalar.__bases__
+                      if issubclass(B, numpy.generic))
+    name = 'ndarray[%s]' % scalar.__name__
+    ns = {'__module__': __name__, 'scalar': scalar, '__slots__': ()}
+    cls = _array_types[scalar] = type(name, bases, ns)
+    return cls
+
+
+def dtype_key(x):
+    """Dispatch key that maps NumPy arrays to their array_type() and all
+    other objects to their types.
+
+    Only exact ndarray instances are mapped. Subclasses of ndarray dispatch on
+    their own types."""
+
+    T = type(x)
+    if numpy is not None and T is numpy.ndarray:
+        try:
+            return _array_types[x.dtype.type]
+        except KeyError:
+            return array_type(x.dtype.type)
+    return T
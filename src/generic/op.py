@@ -157,6 +157,26 @@ TotalOrdered.register(float)
 # Utility functions (maybe some of them are useful enough to go to 
 # pygeneric.util)
 #
+def _same_type_key(argtypes, restype):
+    """Generality key for factories that only depend on the type of the
+    arguments if both are the same and return NotImplemented otherwise."""
+
+    T1, T2 = argtypes
+    return T1 if T1 is T2 else None
+
+
+def _subclass_owner_key(argtypes, restype):
+    """Generality key for factories that only depend on the most general type
+    when one argument is a subclass of the other."""
+
+    T1, T2 = argtypes
+    if issubclass(T1, T2):
+        return T2
+    elif issubclass(T2, T1):
+        return T1
+    return None
+
+
 def _opsame_meta_factory(opname):
     """Returns a factory tha can be used to test if the object implements a 
     __<opname>same__() method"""
@@ -212,7 +232,8 @@ def _arithmetic_op_factory(opname):
             raise_no_methods(op, args=(x, y))
         return out
 
-    op.register(Object, Object, func=_opsame_meta_factory(opname), factory=True)
+    op.register(Object, Object, func=_opsame_meta_factory(opname),
+                factory=True, key=_same_type_key)
     op.__name__ = opname
     return op
 
@@ -265,7 +286,8 @@ def _relational_op_factory(opname, ropname):
             raise_unordered(x, y)
         return out
 
-    op.register(Object, Object, func=_opsame_meta_factory(opname), factory=True)
+    op.register(Object, Object, func=_opsame_meta_factory(opname),
+                factory=True, key=_same_type_key)
     op.__name__ = opname
     return op
 
@@ -294,7 +316,7 @@ def eq(x, y):
     return out
 
 
-@eq.register(Object, Object, factory=True)
+@eq.register(Object, Object, factory=True, key=_subclass_owner_key)
 def _eq_factory(argtypes, restype):
     T1, T2 = argtypes
 
@@ -312,7 +334,11 @@ def _eq_factory(argtypes, restype):
 
     # If we reach here, there are no overloads for (T1, T2), use the default
     # test for object equality
-    return lambda x, y: x is y
+    return _eq_identity
+
+
+def _eq_identity(x, y):
+    return x is y
 
 
 @eq.register(Object, object)
@@ -345,7 +371,7 @@ def ne(x, y):
     return out
 
 
-@ne.register(Object, Object, factory=True)
+@ne.register(Object, Object, factory=True, key=_subclass_owner_key)
 def _ne_factory(argtypes, restype):
     T1, T2 = argtypes
 
@@ -363,7 +389,11 @@ def _ne_factory(argtypes, restype):
 
     # If we reach here, there are no overloads for (T1, T2), use the default
     # test for object equality
-    return lambda x, y: not (x == y)
+    return _ne_not_eq
+
+
+def _ne_not_eq(x, y):
+    return not (x == y)
 
 
 @ne.register(Object, object)
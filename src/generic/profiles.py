@@ -0,0 +1,137 @@
+"""
+Record the signatures handled by generic functions and replay them to warm up
+the caches of new processes.
+
+A fresh process pays for the dispatch algorithm on the first call with each
+tuple of argument types. A profile is a JSON file that lists, for each generic
+function, the tuples of types found in its cache. Replaying it at startup
+resolves these signatures in advance::
+
+    # After (or during) a representative workload
+    dump_profile([add, mul], 'dispatch-profile.json')
+
+    # At the startup of new processes
+    warmup([add, mul], 'dispatch-profile.json')
+
+Generic functions are identified by their names. Pass a dictionary from names
+to generic functions if names are ambiguous. Types are stored as
+"module:qualname" strings and are imported when the profile is loaded. Types
+that cannot be found this way (e.g., classes created inside functions) are
+skipped.
+"""
+
+import importlib
+import json
+
+__all__ = ['record_profile', 'dump_profile', 'load_profile', 'warmup']
+
+PROFILE_VERSION = 1
+
+
+def record_profile(generics):
+    """Return a dictionary from names of generic functions to lists with the
+    tuples of argument types found in their caches."""
+
+    return {name: list(func._cache)
+            for name, func in _as_mapping(generics).items()}
+
+
+def dump_profile(generics, file):
+    """Save the profile of the given generic functions in file. The file can
+    be a path or a file object opened in text mode."""
+
+    data = {}
+    for name, signatures in record_profile(generics).items():
+        data[name] = sorted([typename(T) for T in types]
+                            for types in signatures)
+    data = {'version': PROFILE_VERSION, 'generics': data}
+
+    if isinstance(file, str):
+        with open(file, 'w') as F:
+            json.dump(data, F, indent=1, sort_keys=True)
+    else:
+        json.dump(data, file, indent=1, sort_keys=True)
+
+
+def load_profile(file):
+    """Load a profile saved by dump_profile() and return a dictionary from
+    names to lists of tuples of types. Signatures with types that cannot be
+    imported are skipped."""
+
+    if isinstance(file, str):
+        with open(file) as F:
+            data = json.load(F)
+    else:
+        data = json.load(file)
+
+    if data.get('version') != PROFILE_VERSION:
+        raise ValueError('unsupported profile version: %r' %
+                         data.get('version'))
+
+    types_cache = {}
+    profile = {}
+    for name, signatures in data['generics'].items():
+        result = profile[name] = []
+        for names in signatures:
+            try:
+                types = tuple(_load_type(T, types_cache) for T in names)
+            except LookupError:
+                continue
+            result.append(types)
+    return profile
+
+
+def warmup(generics, profile):
+    """Warm up the caches of the given generic functions with the signatures
+    in profile.
+
+    The profile can be a dictionary returned by load_profile() or
+    record_profile() or a file accepted by load_profile(). Names that are not
+    in the profile are ignored. Return the number of new cache entries."""
+
+    if not isinstance(profile, dict):
+        profile = load_profile(profile)
+
+    count = 0
+    for name, func in _as_mapping(generics).items():
+        count += func.warmup(profile.get(name, ()))
+    return count
+
+
+def typename(T):
+    """Return the "module:qualname" string that identifies a type.
+
+    >>> typename(int)
+    'builtins:int'
+    """
+
+    return '%s:%s' % (T.__module__, T.__qualname__)
+
+
+def _load_type(name, cache):
+    """Import the type with the given "module:qualname" name. Raises a
+    LookupError if it cannot be found."""
+
+    try:
+        return cache[name]
+    except KeyError:
+        pass
+
+    modname, _, qualname = name.partition(':')
+    try:
+        obj = importlib.import_module(modname)
+        for attr in qualname.split('.'):
+            obj = getattr(obj, attr)
+    except (ImportError, AttributeError, ValueError):
+        raise LookupError('could not find type: %s' % name)
+    if not isinstance(obj, type):
+        raise LookupError('not a type: %s' % name)
+
+    cache[name] = obj
+    return obj
+
+
+def _as_mapping(generics):
+    if isinstance(generics, dict):
+        return generics
+    return {func.name: func for func in generics}
@@ -0,0 +1,29 @@
+import io
+from generic import bench
+from generic.bench.__main__ import main
+
+
+def test_run_save_and_compare():
+    results = bench.run(['operators', 'memory'], scale=0.001)
+    assert results['operators/promote_type']['unit'] == 's'
+    assert results['memory/compact/bytes_per_entry']['unit'] == 'bytes'
+
+    F = io.StringIO()
+    bench.save_results(results, F)
+    F.seek(0)
+    assert bench.load_results(F) == results
+
+    slower = {name: {'value': 2 * r['value'], 'unit': r['unit']}
+              for name, r in results.items()}
+    table, regressions = bench.compare(results, slower)
+    assert len(table) == len(results)
+    assert sorted(regressions) == sorted(results)
+    assert bench.compare(slower, results)[1] == []
+
+
+def test_main_compare(tmpdir, capsys):
+    path = str(tmpdir.join('results.json'))
+    assert main(['operators', '--scale', '0.001', '--json', path]) == 0
+    assert main(['operators', '--scale', '0.001', '--compare', path,
+                 '--threshold', '1e6']) == 0
+    assert 'operators/op/add/same' in capsys.readouterr().out
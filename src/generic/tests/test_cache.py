@@ -0,0 +1,190 @@
+import gc
+import pytest
+from generic import generic
+from generic.cache import LRUCache, LFUCache, CompactCache, make_cache
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache['a'] = 1
+    cache['b'] = 2
+    assert cache['a'] == 1
+    cache['c'] = 3
+    assert set(cache) == {'a', 'c'}
+    assert cache.info() == (1, 0, 1, 2, 2)
+
+    with pytest.raises(KeyError):
+        cache['b']
+    assert cache.info().misses == 1
+
+
+def test_lfu_cache_evicts_least_frequently_used():
+    cache = LFUCache(3)
+    cache['a'] = 1
+    cache['b'] = 2
+    cache['c'] = 3
+    for _ in range(3):
+        cache['a']
+    cache['b']
+    cache['d'] = 4
+    assert set(cache) == {'a', 'b', 'd'}
+    cache['e'] = 5
+    assert set(cache) == {'a', 'b', 'e'}
+    del cache['e']
+    cache['f'] = 6
+    cache['g'] = 7
+    assert set(cache) == {'a', 'b', 'g'}
+    assert cache.info().evictions == 3
+
+
+def test_make_cache():
+    assert type(make_cache()) is dict
+    assert isinstance(make_cache(10), LRUCache)
+    assert isinstance(make_cache(10, 'lfu'), LFUCache)
+    with pytest.raises(ValueError):
+        make_cache(10, 'fifo')
+    with pytest.raises(ValueError):
+        make_cache(0)
+
+
+@pytest.mark.parametrize('policy', ['lru', 'lfu'])
+def test_bounded_generic(policy):
+    @generic(maxsize=2, policy=policy)
+    def func(x):
+        return type(x)
+
+    for x in [1, 1.0, 1j, 'one', b'one', 1, 1.0]:
+        assert func(x) is type(x)
+    assert len(func.cache()) == 2
+    info = func.cache_info()
+    assert info.maxsize == 2
+    assert info.evictions == info.misses - 2
+
+    # Invalidated entries are not counted as hits
+    hits = info.hits
+    func.register(float, func=lambda x: 'float')
+    assert func.cache_info().hits == hits
+
+
+def test_unbounded_generic_cache_info():
+    @generic
+    def func(x):
+        return x
+
+    func(1)
+    func(1.0)
+    assert func.cache_info() == (None, None, 0, None, 2)
+
+
+def test_weak_generic_releases_dead_types():
+    import gc
+    import weakref
+
+    @generic(weak=True)
+    def func(x):
+        return 'object'
+
+    A = type('A', (object,), {})
+    ref = weakref.ref(A)
+    assert func(A()) == 'object'
+    assert func(1) == 'object'
+    assert len(func.cache()) == 2
+
+    del A
+    gc.collect()
+    assert ref() is None
+    assert set(func.cache()) == {(int,)}
+    assert func.cache_info().evictions == 1
+
+
+def test_bounded_generic_releases_dynamic_types():
+    import weakref
+
+    @generic(maxsize=4)
+    def func(x):
+        return 'object'
+
+    refs = []
+    for i in range(100):
+        cls = type('A%s' % i, (), {})
+        refs.append(weakref.ref(cls))
+        assert func(cls()) == 'object'
+    del cls
+    gc.collect()
+    assert sum(ref() is not None for ref in refs) <= 4
+
+    func.clear_cache()
+    gc.collect()
+    assert all(ref() is None for ref in refs)
+
+
+def test_weak_generic_iteration():
+    @generic(weak=True)
+    def func(x):
+        return 'object'
+
+    @func.register(int)
+    def func(x):
+        return 'int'
+
+    func(1)
+    assert set(func) == {(object,), (int,)}
+    assert set(func.registry()) == {(object,), (int,)}
+    assert None not in func._cache
+    with pytest.raises(KeyError):
+        func[int, 'x']
+
+
+def test_weak_and_bounded_are_exclusive():
+    with pytest.raises(ValueError):
+        make_cache(10, weak=True)
+
+
+def test_compact_cache_matches_dict():
+    classes = [type('T%s' % i, (), {}) for i in range(30)]
+    cache = CompactCache()
+    data = {}
+    for i, A in enumerate(classes):
+        for j, B in enumerate(classes[:10]):
+            cache[A, B] = data[A, B] = (i, j)
+        cache[A,] = data[A,] = i
+    cache[()] = data[()] = 'empty'
+    assert len(cache) == len(data)
+    assert dict(cache) == data
+
+    for key in list(data)[::3]:
+        del cache[key]
+        del data[key]
+    assert dict(cache) == data
+    assert all(cache[key] == value for key, value in data.items())
+    assert (classes[0], classes[0]) not in cache
+    with pytest.raises(KeyError):
+        del cache[classes[0], classes[0]]
+    assert cache.nbytes() > 0
+
+
+def test_compact_cache_keeps_types_alive():
+    cache = CompactCache()
+    cache[type('A', (), {}), int] = 1
+    gc.collect()
+    (A, B), = list(cache)
+    assert A.__name__ == 'A' and B is int
+    del cache[A, int]
+    assert cache._types == {}
+
+
+def test_compact_generic():
+    @generic(compact=True)
+    def func(x, y):
+        return 'object'
+
+    for x in [1, 1.0, 'one']:
+        assert func(x, x) == 'object'
+    assert isinstance(func._cache, CompactCache)
+    assert len(func.cache()) == 3
+
+    func.register(int, int)(lambda x, y: 'int')
+    assert func(1, 1) == 'int'
+    assert func(1.0, 1.0) == 'object'
+    with pytest.raises(ValueError):
+        make_cache(10, compact=True)
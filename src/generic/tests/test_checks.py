@@ -0,0 +1,78 @@
+import pytest
+from numbers import Number
+from generic import generic, Generic
+from generic.checks import checked
+from generic import core
+
+
+def test_checked_wrapper():
+    def func(x, y, z=0):
+        return x + y + z
+
+    wrapped = checked(func, (Number, object), restype=float)
+    assert wrapped.__name__ == 'func' and wrapped.__wrapped__ is func
+    assert wrapped(1.0, 2) == 3.0
+    assert wrapped(1.0, 2, z=1) == 4.0
+    with pytest.raises(TypeError) as ex:
+        wrapped('a', 'b')
+    assert str(ex.value) == 'func() argument 1 must be Number, got str'
+    with pytest.raises(TypeError) as ex:
+        wrapped(1, 2)
+    assert str(ex.value) == 'func() must return float, got int'
+    with pytest.raises(TypeError):
+        wrapped(1.0, 2, 3)
+
+
+def test_checked_strict():
+    wrapped = checked(lambda x: x, (int,), int, strict=True)
+    assert wrapped(1) == 1
+    with pytest.raises(TypeError):
+        wrapped(True)
+
+
+def test_checked_keyword_names():
+    wrapped = checked(lambda x, y: x - y, (int, int), argnames=['x', 'y'])
+    assert wrapped(y=1, x=3) == 2
+
+    # Names that cannot be used in the wrapper are replaced
+    wrapped = checked(lambda x, y: x - y, (int, int), argnames=['_func', 'y'])
+    assert wrapped(3, 1) == 2
+
+
+@pytest.mark.parametrize('mode', ['instance', 'strict'])
+def test_typecheck_generic(mode):
+    func = Generic('func', typecheck=mode)
+    func.register(int, restype=int)(lambda x: x + 1)
+    func.register(float, restype=float)(lambda x: int(x))
+    func.register(object)(lambda x: x)
+    assert func(1) == 2
+    assert func('one') == 'one'
+    with pytest.raises(TypeError):
+        func(1.0)
+
+    if mode == 'strict':
+        with pytest.raises(TypeError):
+            func(True)
+    else:
+        assert func(True) == 2
+
+
+def test_typecheck_keywords():
+    @generic(keywords=True, typecheck=True)
+    def func(x, y):
+        return 'object'
+
+    func.register(int, int, restype=str)(lambda x, y: 'int')
+    assert func(y=1, x=2) == 'int'
+    assert func(x=1.0, y=2) == 'object'
+
+
+def test_legacy_check_factories():
+    func = lambda x, y: x + y
+    assert core._instance_check_factory(func, (int, int), int)(1, 2) == 3
+    with pytest.raises(TypeError):
+        core._strict_check_factory(func, (int, int), int)(True, 2)
+    with pytest.raises(TypeError):
+        core._restype_checker_factory(func, (int, int), str)(1, 2)
+    with pytest.raises(ValueError):
+        Generic('func', typecheck='always')
@@ -111,6 +111,89 @@ def test_set_conversions(T1, T2):
     with pytest.raises(TypeError):
         convert(b, T1)
 
+def test_conversion_chains(T1, T2):
+    class T3(T2):
+        pass
+
+    class T4:
+        def __init__(self, data):
+            self.data = data
+
+    set_conversion(T1, T2, lambda x: T2(x.data))
+    set_conversion(T2, int, lambda x: x.data)
+    assert convert(T1(1.0), float) == 1.0
+    assert type(convert(T1(1.0), float)) is float
+    assert convert(T3(2), float) == 2.0
+
+    # The cheapest chain is chosen and the cache is invalidated
+    set_conversion(T1, T4, lambda x: T4(x.data), cost=5)
+    set_conversion(T4, float, lambda x: float(x.data + 1), cost=5)
+    assert convert(T1(1), float) == 1.0
+    set_conversion(T1, float, lambda x: float(x.data + 2), cost=1)
+    assert convert(T1(1), float) == 3.0
+
+    # Conversions are not inherited from subclasses
+    with pytest.raises(TypeError):
+        get_conversion(T2, T1)
+    with pytest.raises(TypeError):
+        get_conversion(T4, T1)
+
+
+def test_subclass_conversion_is_identity():
+    class A: pass
+    class B(A): pass
+
+    b = B()
+    assert get_conversion(B, A)(b) is b
+    with pytest.raises(TypeError):
+        get_conversion(A, B)
+
+
+def test_partial_conversions_are_not_chained():
+    # complex -> bool -> float would convert 1+0j, but not 2+0j
+    with pytest.raises(TypeError):
+        get_conversion(complex, float)
+    with pytest.raises(TypeError):
+        convert(1 + 0j, float)
+
+    # They still apply to subclasses
+    class MyFloat(float):
+        pass
+
+    assert convert(MyFloat(2.0), int) == 2
+    with pytest.raises(InexactError):
+        convert(MyFloat(2.5), int)
+
+
+def test_failed_conversions_are_cached(T1, T2):
+    from generic import conversion
+
+    with pytest.raises(TypeError):
+        get_conversion(T1, T2)
+    assert isinstance(conversion.CONVERT_PATHS[T1, T2], str)
+    with pytest.raises(TypeError):
+        convert(T1(1), T2)
+
+    set_conversion(T1, T2, lambda x: T2(x.data))
+    assert convert(T1(1), T2) == T2(1)
+
+
+def test_abc_registration_invalidates_conversions():
+    import abc
+
+    class A(metaclass=abc.ABCMeta):
+        pass
+
+    class B:
+        pass
+
+    with pytest.raises(TypeError):
+        get_conversion(B, A)
+    A.register(B)
+    b = B()
+    assert get_conversion(B, A)(b) is b
+
+
 #
 # Promotions
 #
@@ -184,5 +267,164 @@ def test_failed_promotions():
     with pytest.raises(RuntimeError):
         set_promotion(str, str, function=str)
 
+def test_failed_promotions_are_cached(T1, T2):
+    from generic import conversion
+
+    for _ in range(2):
+        with pytest.raises(TypeError):
+            promote(T1(1), T2(2))
+    assert (T1, T2) in conversion.PROMOTION_CACHE
+
+    set_conversion(T2, T1, lambda x: T1(x.data))
+    set_promotion_rule(T1, T2, T1)
+    assert (T1, T2) not in conversion.PROMOTION_CACHE
+    assert_allsame(promote(T1(1), T2(2)), (T1(1), T1(2)))
+
+
+def test_promotions_of_subclasses_are_cached():
+    from generic import conversion
+
+    class MyInt(int):
+        pass
+
+    class A:
+        pass
+
+    class B(A):
+        pass
+
+    assert_allsame(promote(MyInt(1), 2.0), (1.0, 2.0))
+    assert_allsame(promote(2.0, MyInt(1)), (2.0, 1.0))
+    assert (MyInt, float) in conversion.PROMOTION_CACHE
+
+    # Subclasses are promoted in the correct order
+    set_conversion(A, B, lambda x: B())
+    a, b = A(), B()
+    assert [type(x) for x in promote(a, b)] == [B, B]
+    assert [type(x) for x in promote(b, a)] == [B, B]
+    assert (A, B) in conversion.PROMOTION_CACHE
+
+    set_promotion_rule(MyInt, complex, complex)
+    assert conversion.PROMOTION_CACHE == {}
+
+
+def test_bulk_promotions_match_pairwise_promotions():
+    from generic.conversion import _promote_pairwise
+
+    class MyInt(int):
+        pass
+
+    for values in [[1, True, 2.0] * 100, [True, 1j, 2] * 10,
+                   [1, MyInt(2), 3.0], [True, False, True]]:
+        bulk = promote(*values)
+        assert_allsame(bulk, _promote_pairwise(values))
+        assert len(set(map(type, bulk))) == 1
+
+    # Custom promotion functions are respected
+    class Meter(float):
+        pass
+
+    class Foot(float):
+        pass
+
+    def feet_to_meters(x, y):
+        return x, Meter(y * 0.3048)
+
+    set_promotion(Meter, Foot, function=feet_to_meters, restype=float)
+    values = [Meter(1), Foot(10), Meter(2)]
+    assert promote(*values) == _promote_pairwise(values)
+    assert promote(*values) == (1.0, 3.048, 2.0)
+
+
+def test_convert_many():
+    from generic import convert_many
+
+    assert_allsame(convert_many([1, 2.0, True], float), [1.0, 2.0, 1.0])
+    assert_allsame(convert_many(iter([1, True]), int), [1, 1])
+    assert convert_many([], float) == []
+
+    with pytest.raises(InexactError) as info:
+        convert_many([1, 2.0, 3.5], int)
+    assert info.value.index == 2
+
+    with pytest.raises(TypeError) as info:
+        convert_many([1.0, '2'], float)
+    assert 'index 1' in str(info.value)
+
+
+def test_promote_arrays():
+    from generic import promote_arrays
+
+    assert promote_arrays([1, 2], [3.0, True]) == ([1.0, 2.0], [3.0, 1.0])
+    assert promote_arrays([1, 2], [3]) == ([1, 2], [3])
+    assert promote_arrays([], []) == ([], [])
+
+    # Custom promotion functions are respected
+    class Meter(float):
+        pass
+
+    class Foot(float):
+        pass
+
+    def feet_to_meters(x, y):
+        return x, Meter(y * 0.3048)
+
+    set_promotion(Meter, Foot, function=feet_to_meters, restype=Meter)
+    a, b = promote_arrays([Meter(1), Meter(2)], [Foot(10)])
+    assert (a, b) == ([1.0, 2.0], [3.048])
+    assert all(type(x) is Meter for x in a + b)
+
+
+def test_convert_many_numpy_arrays():
+    from generic import convert_many, promote_arrays
+    numpy = pytest.importorskip('numpy')
+
+    x = convert_many(numpy.array([1, 2, 3]), float)
+    assert x.dtype == numpy.float64 and list(x) == [1.0, 2.0, 3.0]
+
+    with pytest.raises(InexactError) as info:
+        convert_many(numpy.array([[1.0, 2.0], [3.0, 4.5]]), int)
+    assert info.value.index == (1, 1)
+    with pytest.raises(InexactError) as info:
+        convert_many(numpy.array([0, 1, 2]), bool)
+    assert info.value.index == 2
+
+    # Values out of the range of the integer types are not wrapped around
+    with pytest.raises(InexactError) as info:
+        convert_many(numpy.array([1, 2**64 - 1], dtype=numpy.uint64), int)
+    assert info.value.index == 1
+    with pytest.raises(InexactError) as info:
+        convert_many(numpy.array([-1]), numpy.uint64)
+    assert info.value.index == 0
+    with pytest.raises(InexactError) as info:
+        convert_many(numpy.array([1.0, 2.0**63]), int)
+    assert info.value.index == 1
+    for value in [float('nan'), float('inf')]:
+        with pytest.raises(InexactError) as info:
+            convert_many(numpy.array([0.0, value]), int)
+        assert info.value.index == 1
+    x = convert_many(numpy.array([2**63 - 1], dtype=numpy.uint64), int)
+    assert x.tolist() == [2**63 - 1]
+
+    # Complex arrays are converted as lists of complex numbers are
+    values = [1 + 0j, 2 + 3j]
+    for data in [values, numpy.array(values)]:
+        with pytest.raises(InexactError) as info:
+            convert_many(data, int)
+        assert info.value.index == 1
+        with pytest.raises(TypeError):
+            convert_many(data, float)
+    x = convert_many(numpy.array([1 + 0j, 2 + 0j]), int)
+    assert x.dtype.kind == 'i' and list(x) == [1, 2]
+
+    x = convert_many(numpy.array(['a', 'bc'], dtype=object), str)
+    assert list(x) == ['a', 'bc']
+
+    a, b = promote_arrays(numpy.array([1, 2]), numpy.array([0.5]))
+    assert a.dtype == b.dtype == numpy.float64
+    a, b = promote_arrays(numpy.array([1, 2]), [0.5])
+    assert list(a) == [1.0, 2.0] and b == [0.5]
+
+
 if __name__ == '__main__':
     pytest.main('test_conversions.py -q')
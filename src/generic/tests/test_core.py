@@ -1,6 +1,11 @@
 import pytest
 import six
-from generic import generic
+import weakref
+import gc
+from numbers import Number, Integral
+from generic import generic, Generic, freeze_all, all_generics, clear_caches
+from generic import cache_memory_report
+from generic import core
 
 
 @pytest.fixture
@@ -129,8 +134,271 @@ def test_factory(addfunc):
     assert (int, int, object, object) not in addfunc
     assert addfunc(1, 2, 3) == 6
     assert addfunc(1, 2, 3.0) == 6.5
+
+
+def test_factory_key():
+    calls = []
+    func = Generic('func')
+
+    @func.register(Number, Number, factory=True,
+                   key=lambda argtypes, restype: argtypes[0] is argtypes[1])
+    def factory(argtypes, restype):
+        calls.append(argtypes)
+        if argtypes[0] is argtypes[1]:
+            return lambda x, y: 'same'
+        return NotImplemented
+
+    func.register(object, object)(lambda x, y: 'other')
+    assert func(1, 2) == func(1.0, 2.0) == 'same'
+    assert func(1, 2.0) == func(1.0, 2) == 'other'
+    assert func[int, int] is func[float, float]
+    assert calls == [(int, int), (int, float)]
+
+    func.clear_cache()
+    assert func(1j, 2j) == 'same'
+    assert len(calls) == 3
+
+    with pytest.raises(TypeError):
+        func.register(int, int, func=lambda x, y: None, key=len)
     
-    
+
+
+def test_registration_invalidates_only_shadowed_entries(addfunc):
+    class A(int): pass
+
+    addfunc(1, 2)
+    addfunc(A(1), 2)
+    addfunc(1.0, 2)
+    addfunc(1.0, 2.0)
+    assert len(addfunc.cache()) == 4
+
+    # Only (A, int) can be shadowed by the new method
+    addfunc.register(A, int, func=lambda x, y: 'A')
+    assert addfunc.invalidations()[A, int] == 1
+    assert set(addfunc.cache()) == {(int, int), (float, int), (float, float)}
+    assert addfunc(A(1), 2) == 'A'
+
+    # (int, int) has precedence over (int, float), nothing to evict
+    addfunc.register(int, float, func=lambda x, y: 'int, float')
+    assert addfunc.invalidations()[int, float] == 0
+    assert addfunc(1, 2.0) == 'int, float'
+
+    # Factories may skip to less specific methods and do not protect the
+    # entries of their subtypes
+    @generic
+    def g(x):
+        return 'object'
+
+    @g.register(int, factory=True)
+    def g_factory(argtypes, restype):
+        if argtypes[0] is bool:
+            return NotImplemented
+        return lambda x: 'int'
+
+    assert g(True) == 'object'
+    g.register(Integral, func=lambda x: 'Integral')
+    assert g(True) == 'Integral'
+    assert g.dispatch(bool)(True) == 'Integral'
+
+
+def test_high_arity_dispatch():
+    @generic
+    def f(a, b, c, d, e, f, g, h):
+        return 'object'
+
+    @f.register(*([int] * 8))
+    def f(*args):
+        return 'int'
+
+    for _ in range(2):
+        assert f(*range(8)) == 'int'
+        assert f(*range(7), 1.0) == 'object'
+        assert f(1.0, *range(7)) == 'object'
+        assert f(*range(8)) == 'int'
+
+
+def test_keyword_dispatch():
+    @generic(keywords=True)
+    def f(x, y, z=None):
+        return 'object'
+
+    @f.register(int, float)
+    def f(x, y, z=None):
+        return 'int, float'
+
+    assert f(1, y=2.0) == 'int, float'
+    assert f(x=1, y=2.0) == 'int, float'
+    assert f(1, 2.0) == 'int, float'
+    assert f(1, y=2) == 'object'
+    with pytest.raises(TypeError):
+        f(1, z=3, y=2.0)
+    with pytest.raises(TypeError):
+        f(1, 2.0, 3)
+    assert f.which(1, y=2.0) is f[int, float]
+
+
+def test_pure_python_inline_cache():
+    PyGeneric = type('PyGeneric', (core.Generic,),
+                     dict(core._pure_python_methods))
+    f = PyGeneric('f')
+    for types in [(), (object,), (object,) * 2, (object,) * 3, (object,) * 4]:
+        f.register(*types, func=lambda *args: 'object')
+    f.register(int, func=lambda x: 'int')
+    f.register(int, int, func=lambda x, y: 'int')
+    f.register(int, int, int, func=lambda x, y, z: 'int')
+
+    for _ in range(2):
+        assert f() == 'object'
+        assert f(1) == 'int'
+        assert f(1.0) == 'object'
+        assert f(1, 2) == 'int'
+        assert f(1, 2.0) == 'object'
+        assert f(1, 2, 3) == 'int'
+        assert f(1, 2, 3.0) == 'object'
+        assert f(1, 2, 3, 4) == 'object'
+
+    # Registering new methods must reset the inline caches
+    f.register(float, func=lambda x: 'float')
+    assert f(1.0) == 'float'
+
+
+def test_bind_site(addfunc):
+    site = addfunc.bind_site(size=2)
+    for _ in range(3):
+        assert site(1, 1) == 3
+        assert site(1.0, 1.0) == 3.5
+        assert site(1, 1.0) == 2
+
+    # New methods reset the site caches
+    addfunc.register(int, float, func=lambda x, y: 'int, float')
+    assert site(1, 1.0) == 'int, float'
+
+    with pytest.raises(ValueError):
+        addfunc.bind_site(size=0)
+
+
+def test_starmap(addfunc):
+    args = [(1, 1), (1.0, 1.0), (1, 1.0), (2, 2), (2.0, 2.0)]
+    expected = [addfunc(*x) for x in args]
+    counts = {}
+    assert addfunc.starmap(args, counts=counts) == expected
+    assert counts == {(int, int): 2, (float, float): 2, (int, float): 1}
+    assert sorted(addfunc.starmap(args, ordered=False)) == sorted(expected)
+    assert addfunc.starmap([]) == []
+
+
+def test_map(addfunc):
+    xs = [1, 1.0, 1]
+    ys = [1, 1.0, 1.0]
+    assert addfunc.map(xs, ys) == [3, 3.5, 2.0]
+
+
+def test_starmap_resolves_before_calling():
+    calls = []
+    func = Generic('func')
+    func.register(int)(calls.append)
+    with pytest.raises(TypeError):
+        func.starmap([(1,), (2,), ('a',)])
+    assert calls == []
+
+
+def test_typeof_dispatch():
+    Small = type('Small', (int,), {})
+    typeof = lambda x: Small if type(x) is int and abs(x) < 10 else type(x)
+
+    @generic(typeof=typeof)
+    def size(x):
+        return 'other'
+
+    @size.register(Small)
+    def size(x):
+        return 'small'
+
+    @size.register(int)
+    def size(x):
+        return 'int'
+
+    site = size.bind_site()
+    for _ in range(2):
+        assert size(1) == site(1) == 'small'
+        assert size(100) == site(100) == 'int'
+        assert size(1.0) == site(1.0) == 'other'
+    assert size.which(1)(1) == 'small'
+    assert size.map([1, 100]) == ['small', 'int']
+    assert (Small,) in size._cache
+
+
+def test_freeze(addfunc):
+    addfunc.register(Number, Number, func=lambda x, y: 'number')
+    assert not addfunc.frozen
+    addfunc.freeze()
+    assert addfunc.frozen
+
+    # Concrete signatures are resolved in advance
+    cache = addfunc.cache()
+    assert (int, int) in cache and (float, float) in cache
+    assert (Number, Number) not in cache
+
+    with pytest.raises(RuntimeError):
+        addfunc.register(int, float, func=lambda x, y: None)
+    with pytest.raises(RuntimeError):
+        addfunc[str, str] = lambda x, y: None
+
+    # New types are still dispatched and cached
+    assert addfunc(1, 1.0) == 'number'
+    assert (int, float) in cache
+    addfunc.freeze()
+
+
+def test_freeze_all(monkeypatch):
+    monkeypatch.setattr(core, '_generics', weakref.WeakValueDictionary())
+    funcs = [Generic('f'), Generic('g')]
+    freeze_all()
+    assert all(func.frozen for func in funcs)
+
+
+def test_instrument(addfunc):
+    stats = addfunc.instrument()
+    assert addfunc.instrument() is stats
+    for args in [(1, 1), (1, 1), (1.0, 1.0), (1, 1)]:
+        addfunc(*args)
+    assert (stats.slot_hits, stats.cache_hits, stats.misses) == (1, 1, 2)
+    assert stats.calls == 4
+
+    data = stats.as_dict()
+    assert data['dispatches'] == data['factory_calls'] == 2
+    assert sum(n for _, n in data['dispatch_histogram']) == 2
+    assert data['dispatch_time'] > 0
+
+    assert addfunc.instrument(False) is stats
+    addfunc(1, 1)
+    assert stats.calls == 4
+    assert addfunc.instrument(False) is None
+
+
+def test_global_registry(monkeypatch):
+    monkeypatch.setattr(core, '_generics', weakref.WeakValueDictionary())
+    f = generic(lambda x: x)
+    g = generic(lambda x: x, maxsize=4)
+    h = Generic('h')
+    assert [id(x) for x in all_generics()] == [id(f), id(g), id(h)]
+    del h
+    gc.collect()
+    assert [id(x) for x in all_generics()] == [id(f), id(g)]
+
+    for x in [1, 2.0, 'a']:
+        f(x)
+        g(x)
+    report = cache_memory_report()
+    assert [r['entries'] for r in report] == [3, 3]
+    assert all(r['nbytes'] > 0 for r in report)
+    assert report[0]['nbytes'] >= report[1]['nbytes']
+
+    clear_caches()
+    assert len(f.cache()) == len(g.cache()) == 0
+    assert f(1) == 1
+
+
 #
 # Regressions
 #
@@ -1,5 +1,8 @@
 import pytest
-from generic import generic, Number, DispatchError
+from generic import generic, Number, DispatchError, ABCMeta
+from generic.core import subtypecheck
+from generic.dispatchtree import DispatchTree
+from generic.abccache import issubtype, abc_cache_info, abc_cache_clear
 
 
 def register(generic,  *types):
@@ -65,6 +68,82 @@ def test_ambiguous_dispatch():
         f(A(1), 1)
 
 
+def test_dispatch_tree_candidates():
+    class A(int): pass
+    class B(A): pass
+
+    signatures = [(object, object), (int, int), (int, A), (A, A), (Number, A)]
+    tree = DispatchTree(signatures + [None])
+    for args in [(int, int), (A, B), (B, B), (float, B), (str, str), (B,)]:
+        expected = {S for S in signatures if subtypecheck(args, S)}
+        assert tree.candidates(args) == expected | {None}
+
+
+def test_dispatch_tree_is_updated_incrementally():
+    class A(int): pass
+    class B(A): pass
+
+    def call(f, *args):
+        return f.dispatch(*map(type, args))(*args)
+
+    f = generic(lambda: None)
+    register(f, object, object)
+    assert call(f, B(0), B(0)) == (object, object)
+    register(f, A, object)
+    assert call(f, B(0), B(0)) == (A, object)
+    register(f, Number, B)
+    assert call(f, 0, B(0)) == (Number, B)
+    with pytest.raises(DispatchError):
+        call(f, B(0), B(0))
+    register(f, A, B)
+    assert call(f, B(0), B(0)) == (A, B)
+
+
+def test_dispatch_tree_respects_abc_registration():
+    class A(object): pass
+    class Base(metaclass=ABCMeta): pass
+
+    f = generic(lambda: None)
+    register(f, object)
+    register(f, Base)
+    assert f(A()) == object
+    Base.register(A)
+    assert f.dispatch(A)(A()) == Base
+
+
+def test_abc_memo():
+    abc_cache_clear()
+    Base = ABCMeta('Base', (), {})
+    A = type('A', (), {})
+
+    assert not issubtype(A, Base)
+    assert not issubtype(A, Base)
+    assert abc_cache_info()[:4] == (1, 1, 1, 0)
+
+    # Registration invalidates the memo
+    Base.register(A)
+    assert issubtype(A, Base)
+    assert abc_cache_info()[:4] == (1, 2, 1, 1)
+
+    # Checks between regular classes do not count as avoided ABC checks
+    assert issubtype(bool, int) and issubtype(bool, int)
+    assert abc_cache_info()[:3] == (2, 3, 1)
+
+
+def test_abc_memo_in_dispatch():
+    Base = ABCMeta('Base', (), {})
+    A = type('A', (), {})
+    f = generic(lambda x: 'object')
+    register(f, Base)
+    register(f, Number)
+    assert f(A()) == 'object'
+    assert subtypecheck((A,), (Base,)) is False
+
+    Base.register(A)
+    assert f.dispatch(A)(A()) == Base
+    assert subtypecheck((A,), (Base,)) is True
+
+
 if __name__ == '__main__':
     #pytest.main('test_dispatch.py -q --tb=native')
-    pytest.main('test_dispatch.py -q')
\ No newline at end of file
+    pytest.main('test_dispatch.py -q')
@@ -0,0 +1,57 @@
+import pytest
+from generic import generic
+from generic.keys import array_type, dtype_key
+
+np = pytest.importorskip('numpy')
+
+
+@pytest.fixture
+def addfunc():
+    @generic(typeof=dtype_key)
+    def addfunc(x, y):
+        return 'fallback'
+
+    @addfunc.register(np.ndarray, np.ndarray)
+    def addfunc(x, y):
+        return 'array'
+
+    @addfunc.register(array_type(np.floating), array_type(np.floating))
+    def addfunc(x, y):
+        return 'float'
+
+    @addfunc.register(array_type(np.int64), array_type(np.int64))
+    def addfunc(x, y):
+        return 'int64'
+
+    return addfunc
+
+
+def test_array_type_hierarchy():
+    F = array_type(np.float64)
+    assert F is array_type(np.dtype('float64'))
+    assert issubclass(F, array_type(np.floating))
+    assert issubclass(F, array_type(np.number))
+    assert issubclass(F, np.ndarray)
+    assert not issubclass(F, array_type(np.integer))
+    assert F.__name__ == 'ndarray[float64]'
+    with pytest.raises(TypeError):
+        array_type(float)
+
+
+def test_dtype_key():
+    x = np.zeros(3, dtype=np.float32)
+    assert dtype_key(x) is array_type(np.float32)
+    assert dtype_key(1.0) is float
+    assert dtype_key(np.float64(1.0)) is np.float64
+
+
+def test_dtype_dispatch(addfunc):
+    f32 = np.zeros(2, dtype=np.float32)
+    f64 = np.zeros(2)
+    i64 = np.zeros(2, dtype=np.int64)
+    for _ in range(2):
+        assert addfunc(f32, f64) == 'float'
+        assert addfunc(i64, i64) == 'int64'
+        assert addfunc(i64, f64) == 'array'
+        assert addfunc(1, 2) == 'fallback'
+    assert (array_type(np.float32), array_type(np.float64)) in addfunc._cache
@@ -193,3 +193,19 @@ def test_generic_relations_work_for_non_generic_types():
     assert ge(1, 1) and gt(2, 1)
     assert ne(1, 2) and not eq(2, 1)
 
+
+def test_subclasses_share_factory_results(T):
+    class S1(T):
+        pass
+
+    class S2(T):
+        pass
+
+    class U(Object):
+        pass
+
+    # The implementation for T is shared by all pairs of subclasses
+    assert S1(1) == T(1) and T(1) == S2(1) and S1(1) == S1(1)
+    assert eq[S1, T] is eq[T, S2] is eq[S1, S1]
+    assert not U() == T(1)
+    assert eq[U, T] is eq[T, U] is op._eq_identity
@@ -0,0 +1,68 @@
+import io
+import pytest
+from generic import generic, Generic
+from generic.profiles import record_profile, dump_profile, load_profile, warmup
+
+
+class Foo(object):
+    pass
+
+
+def make_func():
+    @generic
+    def func(x, y):
+        return 'fallback'
+
+    @func.register(int, int)
+    def func(x, y):
+        return 'int'
+
+    @func.register(float, float, factory=True)
+    def func(argtypes, restype):
+        return NotImplemented
+
+    return func
+
+
+@pytest.fixture
+def profile():
+    func = make_func()
+    Local = type('Local', (), {})
+    for args in [(1, 2), (1.0, 2.0), (Foo(), 1), (Local(), 1)]:
+        func(*args)
+    file = io.StringIO()
+    dump_profile([func], file)
+    file.seek(0)
+    return load_profile(file)
+
+
+def test_load_profile(profile):
+    assert sorted(profile['func'], key=str) == sorted(
+        [(int, int), (float, float), (Foo, int)], key=str)
+
+
+def test_warmup(profile):
+    func = make_func()
+    assert len(func.cache()) == 0
+    assert warmup([func], profile) == 3
+    assert func.cache()[int, int](1, 2) == 'int'
+    assert func.cache()[float, float](1.0, 2.0) == 'fallback'
+    assert warmup([func], profile) == 0
+
+
+def test_warmup_skips_invalid_signatures():
+    func = Generic('func')
+    func.register(int, int)(lambda x, y: x + y)
+    assert func.warmup([(int, int), (str, str)]) == 1
+    assert list(func.cache()) == [(int, int)]
+
+
+def test_record_profile():
+    func = make_func()
+    func(1, 2)
+    assert record_profile({'name': func}) == {'name': [(int, int)]}
+
+
+def test_invalid_version():
+    with pytest.raises(ValueError):
+        load_profile(io.StringIO('{"version": 0, "generics": {}}'))
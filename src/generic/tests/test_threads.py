@@ -0,0 +1,179 @@
+import sys
+import threading
+import pytest
+from generic import generic
+from generic import core
+
+NTHREADS = 8
+
+
+@pytest.fixture(autouse=True)
+def switch_often():
+    # Force frequent thread switches in builds with a GIL
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def run_threads(target, n=NTHREADS):
+    errors = []
+    barrier = threading.Barrier(n)
+
+    def worker(i):
+        try:
+            barrier.wait()
+            target(i)
+        except Exception as ex:
+            errors.append(ex)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+def make_classes(n):
+    return [type('T%s' % i, (), {}) for i in range(n)]
+
+
+@pytest.mark.parametrize('options', [{}, {'maxsize': 16},
+                                     {'maxsize': 16, 'policy': 'lfu'},
+                                     {'weak': True}])
+def test_concurrent_misses(options):
+    classes = make_classes(64)
+    objects = [cls() for cls in classes]
+
+    @generic(**options)
+    def func(x, y):
+        return (type(x), type(y))
+
+    site = func.bind_site()
+
+    def target(i):
+        for n in range(2000):
+            x = objects[(n * 7 + i) % len(objects)]
+            y = objects[(n * 13 + 3 * i) % len(objects)]
+            assert func(x, y) == (type(x), type(y))
+            assert site(x, y) == (type(x), type(y))
+            assert func.starmap([(x, y), (y, x)]) == [(type(x), type(y)),
+                                                      (type(y), type(x))]
+
+    run_threads(target)
+
+
+def test_register_while_calling():
+    classes = make_classes(20)
+    done = threading.Event()
+
+    @generic
+    def func(x):
+        return 'object'
+
+    site = func.bind_site()
+
+    def target(i):
+        if i == 0:
+            for cls in classes:
+                func.register(cls)(lambda x, name=cls.__name__: name)
+            done.set()
+        else:
+            while not done.is_set():
+                for cls in classes:
+                    func(cls())
+                    site(cls())
+
+    run_threads(target)
+
+    # No stale method can survive in any of the caches
+    for cls in classes:
+        assert func(cls()) == cls.__name__
+        assert site(cls()) == cls.__name__
+        assert func._cache[cls,](None) == cls.__name__
+
+
+def test_last_call_consistency():
+    # Each thread alternates between its own pair of types, so the last call
+    # cache is constantly overwritten by other threads
+    classes = make_classes(2 * NTHREADS)
+
+    @generic
+    def func(x):
+        return type(x)
+
+    def target(i):
+        a, b = classes[2 * i](), classes[2 * i + 1]()
+        for _ in range(5000):
+            assert func(a) is type(a)
+            assert func(b) is type(b)
+
+    run_threads(target)
+
+
+@pytest.mark.skipif(core._FastCache is None, reason='requires core_fast')
+def test_per_thread_last_call_cache():
+    from generic.core_fast import _thread_slot
+
+    # Two threads take turns calling with different types. Each one should
+    # always hit its own last call slot, without touching the cache.
+    func = generic(lambda x: None, maxsize=8)
+    slots = {}
+    roles = {}
+    ready = threading.Barrier(NTHREADS + 1)
+    turns = [threading.Event(), threading.Event()]
+
+    def worker(i):
+        slots[i] = _thread_slot()
+        ready.wait()
+        ready.wait()
+        if i not in roles:
+            return
+        role = roles[i]
+        arg = [1, 1.0][role]
+        for _ in range(50):
+            turns[role].wait()
+            turns[role].clear()
+            func(arg)
+            turns[1 - role].set()
+
+    threads = [threading.Thread(target=worker, args=(i,))
+               for i in range(NTHREADS)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    for i in range(1, NTHREADS):
+        if slots[i] != slots[0]:
+            roles.update({0: 0, i: 1})
+            break
+    ready.wait()
+    turns[0].set()
+    for thread in threads:
+        thread.join()
+
+    if not roles:
+        pytest.skip('all threads share the same slot')
+    info = func.cache_info()
+    assert (info.hits, info.misses) == (0, 2)
+
+
+def test_concurrent_registration_is_serialized():
+    @generic
+    def func(x):
+        return 'object'
+
+    classes = make_classes(NTHREADS)
+    results = []
+
+    def target(i):
+        try:
+            func.register(classes[0])(lambda x: i)
+        except TypeError:
+            results.append('error')
+        else:
+            results.append('ok')
+
+    run_threads(target)
+    assert sorted(results) == ['error'] * (NTHREADS - 1) + ['ok']